@@ -1,6 +1,7 @@
 from fastapi import APIRouter
-from . import public, secure
+from . import public, secure, batch
 
 router = APIRouter()
 router.include_router(public.router, prefix="")
 router.include_router(secure.router, prefix="")
+router.include_router(batch.router, prefix="")
@@ -0,0 +1,153 @@
+import asyncio
+import json
+import math
+from typing import Optional, Tuple
+from urllib.parse import urlsplit
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from starlette.requests import Request as StarletteRequest
+
+from app.core.config import settings
+from app.schemas.batch import BatchRequest, BatchResponse, BatchSubRequest, BatchSubResponse
+from app.services.auth_guard import auth_required
+from app.services.proxy import forward
+from app.services.response_cache import response_cache
+from app.utils.admission import Shed
+
+router = APIRouter(tags=["batch"])
+
+_ALLOWED_METHODS = {"GET", "POST", "PUT", "PATCH", "DELETE"}
+# Заголовки родительского запроса, которые не переносятся в подзапросы
+_DROP_HEADERS = {b"content-length", b"content-type", b"transfer-encoding", b"if-none-match", b"range"}
+
+
+def _upstream(path: str) -> Optional[Tuple[str, str]]:
+    """Путь гейтвея -> (base_url, path_suffix), как в public/secure маршрутах."""
+    # Третий элемент: срезать ли завершающий "/" (secure-маршруты делают так же)
+    routes = (
+        ("/api/auth", settings.AUTH_SERVICE_URL, False),
+        ("/api/catalog", settings.CATALOG_SERVICE_URL, False),
+        ("/api/reviews", settings.REVIEW_SERVICE_URL, True),
+        ("/api/favourites", settings.FAVOURITES_SERVICE_URL, True),
+        ("/api/notification", settings.NOTIFY_SERVICE_URL, True),
+    )
+    for prefix, base_url, strip_slash in routes:
+        if path == prefix or path.startswith(prefix + "/"):
+            suffix = path[len("/api/"):]
+            return str(base_url), suffix.rstrip("/") if strip_slash else suffix
+    return None
+
+
+def _sub_request(parent: Request, sub: BatchSubRequest, path: str, query: str) -> StarletteRequest:
+    body = json.dumps(sub.body).encode("utf-8") if sub.body is not None else b""
+    headers = [(k, v) for k, v in parent.scope["headers"] if k not in _DROP_HEADERS]
+    for k, v in sub.headers.items():
+        key = k.lower().encode("latin-1")
+        headers = [(hk, hv) for hk, hv in headers if hk != key]
+        headers.append((key, v.encode("latin-1")))
+    if body:
+        headers.append((b"content-type", b"application/json"))
+        headers.append((b"content-length", str(len(body)).encode("ascii")))
+
+    scope = {
+        **parent.scope,
+        "method": sub.method.upper(),
+        "path": path,
+        "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("utf-8"),
+        "headers": headers,
+        # request_id и user уже проверенного вызывающего
+        "state": dict(parent.scope.get("state", {})),
+    }
+    scope.pop("route", None)
+    scope.pop("endpoint", None)
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    return StarletteRequest(scope, receive)
+
+
+async def _read_body(resp) -> bytes:
+    if hasattr(resp, "body_iterator"):
+        chunks = []
+        async for chunk in resp.body_iterator:
+            chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode("utf-8"))
+        return b"".join(chunks)
+    return resp.body
+
+
+async def _run_one(parent: Request, sub: BatchSubRequest, sem: asyncio.Semaphore) -> BatchSubResponse:
+    parts = urlsplit(sub.path)
+    target = _upstream(parts.path)
+    if sub.method.upper() not in _ALLOWED_METHODS or target is None:
+        return BatchSubResponse(id=sub.id, status=400, body={"detail": "Unsupported sub-request"})
+
+    base_url, path_suffix = target
+    request = _sub_request(parent, sub, parts.path, parts.query)
+    # Каждый подзапрос занимает свой слот допуска, иначе один batch превращается
+    # в BATCH_MAX_REQUESTS запросов в обход контроля допуска
+    admission = getattr(parent.state, "admission", None)
+    async with sem:
+        try:
+            acquired = await admission.admit(request.scope) if admission is not None else []
+        except Shed:
+            return BatchSubResponse(
+                id=sub.id, status=503,
+                headers={"retry-after": str(max(1, math.ceil(settings.ADMISSION_RETRY_AFTER_S)))},
+                body={"detail": "Server overloaded"},
+            )
+        try:
+            if parts.path.startswith("/api/catalog"):
+                resp = await response_cache.forward(request, base_url, path_suffix, invalidate_prefix="/api/catalog")
+            else:
+                resp = await forward(request, base_url, path_suffix)
+            raw = await _read_body(resp)
+        finally:
+            if admission is not None:
+                admission.release(acquired)
+
+    ctype = resp.headers.get("content-type", "")
+    body = None
+    if raw:
+        if "json" in ctype:
+            try:
+                body = json.loads(raw)
+            except ValueError:
+                body = raw.decode("utf-8", errors="replace")
+        else:
+            body = raw.decode("utf-8", errors="replace")
+    keep = {"content-type", "etag", "cache-control", "location", "retry-after"}
+    headers = {k: v for k, v in resp.headers.items() if k.lower() in keep}
+    return BatchSubResponse(id=sub.id, status=resp.status_code, headers=headers, body=body)
+
+
+@router.post("/batch", response_model=BatchResponse)
+async def batch(body: BatchRequest, request: Request, _=Depends(auth_required)):
+    """
+    Несколько подзапросов за один HTTP-вызов. Вызывающий аутентифицируется один раз,
+    подзапросы идут через обычный forward() параллельно, не больше BATCH_CONCURRENCY сразу.
+    Подзапросы списываются с отдельной квоты BATCH_RATE_LIMIT_* (число * BATCH_ITEM_WEIGHT)
+    разом: не хватает — 429 на весь batch. Контроль допуска — на каждый подзапрос,
+    отказ — 503 в его ответе, остальные выполняются.
+    """
+    if len(body.requests) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(status_code=413, detail=f"At most {settings.BATCH_MAX_REQUESTS} sub-requests")
+
+    rate_limiter = getattr(request.state, "rate_limiter", None)
+    if rate_limiter is not None:
+        retry_after = await rate_limiter.check(
+            request,
+            cost=len(body.requests) * settings.BATCH_ITEM_WEIGHT,
+            quota=("batch", settings.BATCH_RATE_LIMIT_RPS, settings.BATCH_RATE_LIMIT_BURST),
+        )
+        if retry_after is not None:
+            raise HTTPException(
+                status_code=429,
+                detail="Too Many Requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+
+    sem = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+    results = await asyncio.gather(*(_run_one(request, sub, sem) for sub in body.requests))
+    return BatchResponse(responses=list(results))
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Request
 from app.core.config import settings
 from app.services.proxy import forward
+from app.services.response_cache import response_cache
 
 router = APIRouter(tags=["public"])
 
@@ -17,9 +18,13 @@ async def auth_proxy(path: str, request: Request):
 
 @router.api_route("/catalog", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def catalog_root(request: Request):
-    return await forward(request, settings.CATALOG_SERVICE_URL, path_suffix="catalog")
+    return await response_cache.forward(
+        request, settings.CATALOG_SERVICE_URL, path_suffix="catalog", invalidate_prefix="/api/catalog"
+    )
 
 
 @router.api_route("/catalog/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
 async def catalog_proxy(path: str, request: Request):
-    return await forward(request, settings.CATALOG_SERVICE_URL, path_suffix=f"catalog/{path}")
+    return await response_cache.forward(
+        request, settings.CATALOG_SERVICE_URL, path_suffix=f"catalog/{path}", invalidate_prefix="/api/catalog"
+    )
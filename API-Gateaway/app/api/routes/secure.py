@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, HTTPException
+from pydantic import BaseModel
 from app.core.config import settings
 from app.services.proxy import forward
 from app.services.auth_guard import auth_required
+from app.services.response_cache import response_cache
 
 router = APIRouter(tags=["secure"])
 
@@ -78,3 +80,16 @@ async def search(request: Request, _=Depends(auth_required)):
 @router.post("/notify/send")
 async def notify(request: Request, _=Depends(auth_required)):
     return await forward(request, settings.NOTIFY_SERVICE_URL)
+
+
+# ====== Gateway response cache ======
+class CacheInvalidateRequest(BaseModel):
+    prefix: str = "/api/catalog"
+
+
+@router.post("/cache/invalidate")
+async def cache_invalidate(body: CacheInvalidateRequest, user=Depends(auth_required)):
+    if not {"admin", "librarian"} & {r.lower() for r in user.get("roles") or []}:
+        raise HTTPException(status_code=403, detail="Forbidden")
+    removed = await response_cache.invalidate(body.prefix)
+    return {"prefix": body.prefix, "removed": removed}
@@ -1,29 +1,182 @@
 from pydantic_settings import BaseSettings
-from pydantic import AnyHttpUrl, field_validator
-from typing import List
+from pydantic import AnyHttpUrl, TypeAdapter, field_validator, model_validator
+from typing import Dict, List, Literal, Tuple
+import json
+
+_HTTP_URL = TypeAdapter(AnyHttpUrl)
 
 
 class Settings(BaseSettings):
     ENV: str = "dev"
     LOG_LEVEL: str = "INFO"
+    LOG_QUEUE_SIZE: int = 10000            # очередь QueueHandler; при переполнении записи теряются
+    LOG_VERBOSE_SAMPLE_RATE: float = 0.01  # доля запросов с подробным DEBUG-логом (по request id)
+    ACCESS_LOG_SAMPLE_RATE: float = 1.0    # доля успешных запросов в access-логе
+    ACCESS_LOG_SLOW_MS: float = 1000.0     # медленные запросы пишутся всегда
 
-    RATE_LIMIT_RPS: float = 5.0   # запросов в секунду (скользящее окно на IP/токен)
+    RATE_LIMIT_RPS: float = 5.0   # запросов в секунду на IP/токен (GCRA)
     RATE_LIMIT_BURST: int = 10
+    RATE_LIMIT_MAX_KEYS: int = 100_000      # размер локального LRU, если Redis недоступен
+    RATE_LIMIT_REDIS_RETRY_S: float = 5.0   # сколько не трогать Redis после ошибки
+    # {"/api/catalog/upload": [1, 3]} — префикс пути -> [rps, burst]
+    RATE_LIMIT_ROUTE_QUOTAS: Dict[str, Tuple[float, int]] = {}
+    # {"admin": [50, 100]} — роль -> [rps, burst]
+    RATE_LIMIT_ROLE_QUOTAS: Dict[str, Tuple[float, int]] = {}
+
+    REDIS_URL: str = ""           # пусто — только локальные структуры в памяти
+    REDIS_TIMEOUT_S: float = 0.2
 
-    AUTH_SERVICE_URL: AnyHttpUrl = "http://localhost:8001"
-    CATALOG_SERVICE_URL: AnyHttpUrl = "http://localhost:8002"
-    FILE_SERVICE_URL: AnyHttpUrl = "http://localhost:8003"
-    SEARCH_SERVICE_URL: AnyHttpUrl = "http://localhost:8004"
-    PROFILE_SERVICE_URL: AnyHttpUrl = "http://localhost:8005"
-    NOTIFY_SERVICE_URL: AnyHttpUrl = "http://localhost:8006"
-    REVIEW_SERVICE_URL: AnyHttpUrl = "http://localhost:8007"
-    FAVOURITES_SERVICE_URL: AnyHttpUrl = "http://localhost:8008"
+    # Один URL или несколько инстансов через запятую / JSON-списком:
+    # CATALOG_SERVICE_URL="http://catalog-1:8002,http://catalog-2:8002"
+    AUTH_SERVICE_URL: str = "http://localhost:8001"
+    CATALOG_SERVICE_URL: str = "http://localhost:8002"
+    FILE_SERVICE_URL: str = "http://localhost:8003"
+    SEARCH_SERVICE_URL: str = "http://localhost:8004"
+    PROFILE_SERVICE_URL: str = "http://localhost:8005"
+    NOTIFY_SERVICE_URL: str = "http://localhost:8006"
+    REVIEW_SERVICE_URL: str = "http://localhost:8007"
+    FAVOURITES_SERVICE_URL: str = "http://localhost:8008"
+
+    # Балансировка между инстансами и активные health-check'и
+    LB_STRATEGY: Literal["p2c", "least"] = "p2c"
+    LB_HEALTH_PATH: str = "/health"
+    LB_HEALTH_INTERVAL_S: float = 5.0
+    LB_HEALTH_TIMEOUT_S: float = 1.0
+    LB_UNHEALTHY_THRESHOLD: int = 2    # неудачных проверок подряд до исключения
+    LB_HEALTHY_THRESHOLD: int = 2      # удачных проверок подряд до возврата
 
     CORS_ALLOW_ORIGINS: List[str] = ["*"]
 
     PROXY_TIMEOUT_S: float = 8.0
     PROXY_RETRIES: int = 2
     PROXY_RETRY_BACKOFF_S: float = 0.3
+    # Circuit breaker и bulkhead на каждый апстрим
+    BREAKER_FAILURE_THRESHOLD: int = 5     # ошибок подряд до размыкания
+    BREAKER_OPEN_S: float = 10.0           # сколько цепь разомкнута до пробного запроса
+    BREAKER_HALF_OPEN_MAX: int = 1         # одновременных пробных запросов
+    BULKHEAD_MAX_CONCURRENT: int = 50      # одновременных запросов на апстрим
+    BULKHEAD_WAIT_S: float = 0.5           # ожидание свободного слота до 503
+    # Контроль допуска: лимиты одновременных запросов, очередь с дедлайном, затем 503
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_MAX_CONCURRENT: int = 150     # меньше пула _CLIENT (200), чтобы не копить очередь в httpx
+    ADMISSION_QUEUE_SIZE: int = 300
+    ADMISSION_QUEUE_TIMEOUT_S: float = 2.0  # сколько запрос может ждать слота
+    ADMISSION_RETRY_AFTER_S: float = 1.0
+    ADMISSION_ROUTE_LIMITS: Dict[str, int] = {"/api/files": 20, "/api/batch": 20}
+    ADMISSION_HIGH_PRIORITY: List[str] = ["/api/auth"]
+    ADMISSION_HIGH_PRIORITY_READS: List[str] = ["/api/catalog"]   # только GET/HEAD
+    ADMISSION_LOW_PRIORITY: List[str] = ["/api/files/upload"]
+    ADMISSION_EXEMPT_PATHS: List[str] = ["/health", "/metrics"]
+    # Single-flight для одинаковых одновременных GET/HEAD (opt-in)
+    PROXY_COALESCE_ENABLED: bool = False
+    PROXY_COALESCE_HEADERS: List[str] = ["authorization", "accept", "accept-encoding", "accept-language"]
+    # Хеджирование GET/HEAD (opt-in): вторая попытка, если первая не ответила за перцентиль задержки
+    PROXY_HEDGE_ENABLED: bool = False
+    PROXY_HEDGE_PATHS: List[str] = [r"^/api/catalog(/|$)"]
+    PROXY_HEDGE_PERCENTILE: float = 0.95
+    PROXY_HEDGE_MIN_DELAY_S: float = 0.05   # не хеджировать раньше этого, даже если p95 меньше
+    PROXY_HEDGE_WINDOW: int = 500           # последних ответов в статистике маршрута
+    PROXY_HEDGE_MIN_SAMPLES: int = 50       # до этого числа ответов хеджирование выключено
+    PROXY_HEDGE_BUDGET_RATIO: float = 0.05  # не больше 5% дополнительных запросов на маршрут
+    PROXY_HEDGE_BUDGET_BURST: int = 10
+    PROXY_HEDGE_MAX_ROUTES: int = 200       # отдельных шаблонов путей со своей статистикой и бюджетом
+    # Ответы, которые отдаются потоком: файлы, Range-запросы, text/event-stream
+    PROXY_STREAM_PATHS: List[str] = [r"^/api/catalog/books/[^/]+/(stream|download)/?$"]
+    PROXY_STREAM_HEADERS_TIMEOUT_S: float = 30.0  # ожидание заголовков ответа
+    PROXY_STREAM_IDLE_TIMEOUT_S: float = 60.0     # максимум тишины между чанками, не длительность передачи
+    PROXY_STREAM_BODY: bool = True          # стримить тела запросов в апстрим без буферизации
+    PROXY_REPLAY_MAX_BYTES: int = 64 * 1024  # тела не больше этого буферизуются и могут ретраиться
+
+    # local — проверка JWT в гейтвее, introspect — всегда через AuthService,
+    # hybrid — локально, а если локально решить нельзя — introspect
+    AUTH_MODE: Literal["local", "introspect", "hybrid"] = "introspect"
+    JWT_SECRET_KEY: str = ""    # общий секрет с AuthService (HS256)
+    JWT_PUBLIC_KEY: str = ""    # PEM публичного ключа для асимметричных алгоритмов
+    JWT_ALG: str = "HS256"
+    JWT_LEEWAY_S: float = 0.0
+    # JWKS AuthService (http://auth:8001/.well-known/jwks.json): ключи по kid с ротацией
+    JWT_JWKS_URL: str = ""
+    JWT_JWKS_REFRESH_S: float = 300.0
+
+    # Пул соединений gateway -> AuthService
+    AUTH_TIMEOUT_S: float = 3.0
+    AUTH_CONNECT_TIMEOUT_S: float = 1.0
+    AUTH_MAX_CONNECTIONS: int = 50
+    AUTH_MAX_KEEPALIVE: int = 20
+    AUTH_KEEPALIVE_EXPIRY_S: float = 30.0
+    AUTH_HTTP2: bool = False
+
+    INTROSPECT_CACHE_ENABLED: bool = True
+    INTROSPECT_CACHE_SIZE: int = 10000
+    INTROSPECT_CACHE_TTL_S: float = 60.0     # верхняя граница для активного токена (но не дольше exp)
+    INTROSPECT_NEGATIVE_TTL_S: float = 5.0   # сколько помним неактивный/невалидный токен
+
+    # Отчёт об активности в AuthService (POST /auth/activity): пользователи, чьи токены проверены
+    # локально или по кэшу introspect. Пусто — отчёт выключен, last_activity_at обновляется
+    # только на промахах кэша introspect
+    INTERNAL_API_TOKEN: str = ""
+    ACTIVITY_REPORT_INTERVAL_S: float = 30.0
+    ACTIVITY_REPORT_MAX_PENDING: int = 10000   # не больше ACTIVITY_REPORT_MAX в AuthService
+
+    # POST /api/batch
+    BATCH_MAX_REQUESTS: int = 50
+    BATCH_CONCURRENCY: int = 8
+    # Отдельная квота подзапросов (GCRA на клиента): batch списывает число подзапросов * вес
+    # разом, обычная квота RATE_LIMIT_RPS тратится только на сам вызов /api/batch
+    BATCH_RATE_LIMIT_RPS: float = 10.0      # подзапросов в секунду; 0 — без квоты
+    BATCH_RATE_LIMIT_BURST: int = 100       # не меньше BATCH_MAX_REQUESTS * BATCH_ITEM_WEIGHT
+    BATCH_ITEM_WEIGHT: float = 1.0
+
+    # Сжатие ответов гейтвеем по Accept-Encoding
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+    COMPRESSION_TYPES: List[str] = [
+        "application/json", "text/", "application/javascript", "application/xml", "image/svg+xml",
+    ]
+
+    # Кэш ответов публичных GET каталога (память + опционально Redis)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_REDIS: bool = False
+    RESPONSE_CACHE_MAX_ENTRIES: int = 2000
+    RESPONSE_CACHE_MAX_BODY_BYTES: int = 1024 * 1024
+    RESPONSE_CACHE_DEFAULT_TTL_S: float = 30.0   # если апстрим не прислал max-age
+    RESPONSE_CACHE_MAX_TTL_S: float = 300.0
+    # Регулярки путей гейтвея; только ответы, не зависящие от пользователя
+    RESPONSE_CACHE_PATHS: List[str] = [
+        r"^/api/catalog/books/?$",
+        r"^/api/catalog/books/search/?$",
+        r"^/api/catalog/books/\d+/?$",
+        r"^/api/catalog/(subjects|authors|langs)/?$",
+    ]
+    # Изменения, после которых сбрасывается кэш каталога. userbook/notes/playlists — личные
+    # данные, в кэшируемые ответы не попадают и кэш не трогают
+    RESPONSE_CACHE_INVALIDATE_PATHS: List[str] = [
+        r"^/api/catalog/(books|authors|subjects|langs|upload)(/|$)",
+    ]
+
+    @field_validator(
+        "AUTH_SERVICE_URL", "CATALOG_SERVICE_URL", "FILE_SERVICE_URL", "SEARCH_SERVICE_URL",
+        "PROFILE_SERVICE_URL", "NOTIFY_SERVICE_URL", "REVIEW_SERVICE_URL", "FAVOURITES_SERVICE_URL",
+        mode="before",
+    )
+    @classmethod
+    def split_service_urls(cls, v):
+        if isinstance(v, str) and v.strip().startswith("["):
+            v = json.loads(v)
+        urls = v if isinstance(v, (list, tuple)) else str(v).split(",")
+        urls = [str(_HTTP_URL.validate_python(u.strip())) for u in urls if str(u).strip()]
+        if not urls:
+            raise ValueError("at least one service URL is required")
+        return ",".join(urls)
+
+    @model_validator(mode="after")
+    def check_batch_quota(self):
+        # Иначе полный batch не пройдёт квоту никогда, даже у клиента без других запросов
+        if self.BATCH_RATE_LIMIT_RPS > 0 and self.BATCH_RATE_LIMIT_BURST < self.BATCH_MAX_REQUESTS * self.BATCH_ITEM_WEIGHT:
+            raise ValueError("BATCH_RATE_LIMIT_BURST must be >= BATCH_MAX_REQUESTS * BATCH_ITEM_WEIGHT")
+        return self
 
     @field_validator("CORS_ALLOW_ORIGINS", mode="before")
     @classmethod
@@ -0,0 +1,35 @@
+# app/core/redis.py
+import logging
+from typing import Optional
+
+from app.core.config import settings
+
+try:
+    from redis import asyncio as aioredis
+except ImportError:  # redis не установлен — работаем только с локальными структурами
+    aioredis = None
+
+log = logging.getLogger(__name__)
+
+_redis = None
+
+
+def get_redis() -> Optional["aioredis.Redis"]:
+    """Общий async-клиент Redis или None, если REDIS_URL не задан."""
+    global _redis
+    if not settings.REDIS_URL or aioredis is None:
+        return None
+    if _redis is None:
+        _redis = aioredis.from_url(
+            settings.REDIS_URL,
+            socket_timeout=settings.REDIS_TIMEOUT_S,
+            socket_connect_timeout=settings.REDIS_TIMEOUT_S,
+        )
+    return _redis
+
+
+async def aclose() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -1,18 +1,74 @@
 # FastAPI
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 # Apps back
 from app.core.config import settings
 from app.api.routes import router as api_router
 from app.utils.request_id import RequestIDMiddleware
-from app.utils.logging import setup_logging
+from app.utils.logging import setup_logging, stop_logging
+from app.utils.access_log import AccessLogMiddleware
 from app.utils.rate_limit import RateLimitMiddleware
+from app.utils.admission import AdmissionMiddleware
+from app.utils import admission
+from app.utils import metrics
+from app.utils.compression import CompressionMiddleware
+from app.services.token_cache import introspect_cache
+from app.services.response_cache import response_cache
+from app.services import activity_reporter, auth_client, balancer, circuit_breaker, hedging, jwt_verifier
+from app.core import redis
 
-app = FastAPI(title="Elib API Gateway", version="0.1.0", redirect_slashes=False)
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    auth_client.get_client()
+    jwt_verifier.start_jwks_refresh()
+    response_cache.start_listener()
+    activity_reporter.start()
+    balancer.start_health_checks([
+        settings.AUTH_SERVICE_URL, settings.CATALOG_SERVICE_URL, settings.FILE_SERVICE_URL,
+        settings.SEARCH_SERVICE_URL, settings.PROFILE_SERVICE_URL, settings.NOTIFY_SERVICE_URL,
+        settings.REVIEW_SERVICE_URL, settings.FAVOURITES_SERVICE_URL,
+    ])
+    yield
+    await jwt_verifier.stop_jwks_refresh()
+    await response_cache.stop_listener()
+    await balancer.stop_health_checks()
+    await activity_reporter.stop()
+    await auth_client.aclose()
+    await redis.aclose()
+    stop_logging()
+
+
+app = FastAPI(title="Elib API Gateway", version="0.1.0", redirect_slashes=False, lifespan=lifespan)
 
 app.add_middleware(RequestIDMiddleware)
-app.add_middleware(RateLimitMiddleware, rate=settings.RATE_LIMIT_RPS, burst=settings.RATE_LIMIT_BURST)
+if settings.ADMISSION_ENABLED:
+    # Внутри rate limiter: клиенты сверх квоты не занимают место в очереди
+    app.add_middleware(
+        AdmissionMiddleware,
+        max_concurrent=settings.ADMISSION_MAX_CONCURRENT,
+        queue_size=settings.ADMISSION_QUEUE_SIZE,
+        queue_timeout=settings.ADMISSION_QUEUE_TIMEOUT_S,
+        route_limits=settings.ADMISSION_ROUTE_LIMITS,
+    )
+app.add_middleware(
+    RateLimitMiddleware,
+    rate=settings.RATE_LIMIT_RPS,
+    burst=settings.RATE_LIMIT_BURST,
+    route_quotas=settings.RATE_LIMIT_ROUTE_QUOTAS,
+    role_quotas=settings.RATE_LIMIT_ROLE_QUOTAS,
+)
+
+if settings.COMPRESSION_ENABLED:
+    app.add_middleware(
+        CompressionMiddleware,
+        min_size=settings.COMPRESSION_MIN_SIZE,
+        content_types=settings.COMPRESSION_TYPES,
+        gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+        brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+    )
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +78,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Снаружи всех остальных: время, статус и байты на проводе считаются для всего стека, включая 429
+app.add_middleware(AccessLogMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
+
 setup_logging()
 
 app.include_router(api_router, prefix="/api")
@@ -29,7 +89,30 @@ app.include_router(api_router, prefix="/api")
 
 @app.get("/health")
 async def health():
-    return {"status": "ok", "service": "api-gateway"}
+    return {
+        "status": "ok",
+        "service": "api-gateway",
+        "introspect_cache": introspect_cache.stats(),
+        "auth_pool": auth_client.pool_stats(),
+        "response_cache": response_cache.stats(),
+        "admission": admission.snapshot(),
+        "activity_report": activity_reporter.snapshot(),
+    }
+
+
+@app.get("/health/upstreams")
+async def health_upstreams():
+    return {
+        "status": "ok",
+        "upstreams": circuit_breaker.snapshot(),
+        "instances": balancer.snapshot(),
+        "hedging": hedging.snapshot(),
+    }
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, media_type=content_type)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -1,13 +1,15 @@
+from typing import Optional
 from pydantic import BaseModel, field_validator
 
 
 class IntrospectResponse(BaseModel):
-    user_id: str
+    user_id: Optional[str] = None
     active: bool
     roles: list[str] = []
+    exp: Optional[int] = None
 
     # Валидатор, который преобразует int в str
     @field_validator("user_id", mode="before")
     @classmethod
     def str_user_id(cls, v):
-        return str(v)
+        return str(v) if v is not None else None
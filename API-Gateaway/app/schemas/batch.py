@@ -0,0 +1,44 @@
+import re
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field, field_validator
+
+# token из RFC 9110 — допустимые символы имени заголовка
+_HEADER_NAME = re.compile(r"^[!#$%&'*+\-.^_`|~0-9A-Za-z]+$")
+
+
+class BatchSubRequest(BaseModel):
+    id: Optional[str] = None
+    method: str = "GET"
+    path: str                      # путь гейтвея с query: /api/catalog/books/1?x=y
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None     # отправляется как JSON
+
+    @field_validator("headers")
+    @classmethod
+    def check_headers(cls, v: Dict[str, str]) -> Dict[str, str]:
+        # Заголовки уходят в ASGI-scope байтами latin-1 — остальное отклоняем здесь (422), а не 500
+        for name, value in v.items():
+            if not _HEADER_NAME.match(name):
+                raise ValueError(f"invalid header name: {name!r}")
+            try:
+                value.encode("latin-1")
+            except UnicodeEncodeError:
+                raise ValueError(f"header {name!r}: value must be latin-1") from None
+            if "\r" in value or "\n" in value or "\0" in value:
+                raise ValueError(f"header {name!r}: control characters are not allowed")
+        return v
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest] = Field(min_length=1)
+
+
+class BatchSubResponse(BaseModel):
+    id: Optional[str] = None
+    status: int
+    headers: Dict[str, str] = {}
+    body: Optional[Any] = None
+
+
+class BatchResponse(BaseModel):
+    responses: List[BatchSubResponse]
@@ -0,0 +1,94 @@
+# app/services/activity_reporter.py
+"""
+Отчёт об активности пользователей в AuthService.
+
+Токены, проверенные локально (AUTH_MODE=local/hybrid) или взятые из кэша introspect,
+до AuthService не доходят, и last_activity_at там не обновлялся бы. Гейтвей копит id
+аутентифицированных пользователей во множестве и раз в ACTIVITY_REPORT_INTERVAL_S
+отправляет их одним POST /auth/activity. Точность last_activity_at — этот интервал
+(плюс интервал сброса в самом AuthService).
+
+Без INTERNAL_API_TOKEN отчёт выключен. Если AuthService недоступен, id остаются до следующей
+попытки, но не больше ACTIVITY_REPORT_MAX_PENDING — лишние теряются (активность best effort).
+"""
+import asyncio
+import logging
+from typing import Optional, Set
+from urllib.parse import urljoin
+
+import httpx
+
+from app.core.config import settings
+from app.services import auth_client
+from app.services.balancer import get_pool
+
+log = logging.getLogger(__name__)
+
+_pending: Set[int] = set()
+_task: Optional[asyncio.Task] = None
+dropped = 0
+
+
+def record(user_id) -> None:
+    """Запомнить активность пользователя. Только множество в памяти — на пути запроса ничего не ждём."""
+    global dropped
+    if not settings.INTERNAL_API_TOKEN or user_id is None:
+        return
+    if len(_pending) >= settings.ACTIVITY_REPORT_MAX_PENDING:
+        dropped += 1
+        return
+    try:
+        _pending.add(int(user_id))
+    except (TypeError, ValueError):
+        pass
+
+
+async def flush() -> None:
+    global _pending, dropped
+    if not _pending:
+        return
+    batch, _pending = _pending, set()
+    instance = get_pool(settings.AUTH_SERVICE_URL).pick()
+    url = urljoin(instance.url.rstrip('/') + '/', 'auth/activity')
+    try:
+        resp = await auth_client.get_client().post(
+            url,
+            json={"user_ids": sorted(batch)},
+            headers={"X-Internal-Token": settings.INTERNAL_API_TOKEN},
+        )
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        log.warning("Activity report failed (%d users): %s", len(batch), e)
+        room = max(0, settings.ACTIVITY_REPORT_MAX_PENDING - len(_pending))
+        keep = list(batch)[:room]
+        dropped += len(batch) - len(keep)
+        _pending.update(keep)
+
+
+async def report_loop() -> None:
+    while True:
+        await asyncio.sleep(settings.ACTIVITY_REPORT_INTERVAL_S)
+        await flush()
+
+
+def start() -> None:
+    global _task
+    if settings.INTERNAL_API_TOKEN and _task is None:
+        _task = asyncio.create_task(report_loop())
+
+
+async def stop() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+        # Последняя пачка перед остановкой, пока клиент AuthService ещё открыт
+        await flush()
+
+
+def snapshot() -> dict:
+    return {"enabled": bool(settings.INTERNAL_API_TOKEN), "pending": len(_pending), "dropped": dropped}
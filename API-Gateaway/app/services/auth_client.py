@@ -1,16 +1,62 @@
 import asyncio
 import httpx
 import logging
+import time
 from typing import Optional
 from app.core.config import settings
 from app.schemas.auth import IntrospectResponse
+from app.services.balancer import get_pool
+from app.services.token_cache import introspect_cache
+from app.utils import metrics
 from urllib.parse import urljoin
 
 log = logging.getLogger(__name__)
 
-async def _post_json(url: str, json: dict, timeout: float) -> httpx.Response:
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        return await client.post(url, json=json)
+# Отдельный долгоживущий клиент для AuthService: свой пул keep-alive соединений
+# и свой профиль таймаутов, не делит лимиты с прокси (_CLIENT в proxy.py)
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(settings.AUTH_TIMEOUT_S, connect=settings.AUTH_CONNECT_TIMEOUT_S),
+            limits=httpx.Limits(
+                max_keepalive_connections=settings.AUTH_MAX_KEEPALIVE,
+                max_connections=settings.AUTH_MAX_CONNECTIONS,
+                keepalive_expiry=settings.AUTH_KEEPALIVE_EXPIRY_S,
+            ),
+            http2=settings.AUTH_HTTP2,
+        )
+    return _client
+
+
+async def aclose() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def pool_stats() -> dict:
+    """Состояние пула соединений к AuthService (внутренности httpcore, best effort)."""
+    if _client is None or _client.is_closed:
+        return {"open": False}
+    pool = getattr(_client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    return {
+        "open": True,
+        "http2": settings.AUTH_HTTP2,
+        "max_connections": settings.AUTH_MAX_CONNECTIONS,
+        "connections": len(connections),
+        "idle": sum(1 for c in connections if c.is_idle()),
+        "queued_requests": len(getattr(pool, "_requests", [])),
+    }
+
+
+async def _post_json(url: str, json: dict) -> httpx.Response:
+    return await get_client().post(url, json=json)
 
 
 async def _retry(fn, retries: int, backoff: float):
@@ -25,17 +71,39 @@ async def _retry(fn, retries: int, backoff: float):
 
 
 async def introspect(token: str) -> Optional[IntrospectResponse]:
+    """
+    Проверка токена в AuthService с кэшем ответов.
+    None — AuthService недоступен/ответил ошибкой; такие результаты не кэшируются.
+    """
+    if settings.INTROSPECT_CACHE_ENABLED:
+        cached = introspect_cache.get(token)
+        metrics.INTROSPECT_CACHE.labels("hit" if cached is not None else "miss").inc()
+        if cached is not None:
+            return cached
+
+    started = time.perf_counter()
+    data = await _introspect_remote(token)
+    metrics.INTROSPECT_DURATION.labels("ok" if data is not None else "error").observe(time.perf_counter() - started)
+    if data is not None and settings.INTROSPECT_CACHE_ENABLED:
+        introspect_cache.put(token, data)
+    return data
+
+
+async def _introspect_remote(token: str) -> Optional[IntrospectResponse]:
     # Align with actual auth routes used by gateway ("/auth/..."),
     # and be robust to trailing '/' in AUTH_SERVICE_URL
-    base = str(settings.AUTH_SERVICE_URL).rstrip('/') + '/'
+    pool = get_pool(settings.AUTH_SERVICE_URL)
+    instance = pool.pick()
+    base = instance.url.rstrip('/') + '/'
     url = urljoin(base, 'auth/introspect')
 
     async def call():
-        resp = await _post_json(url, {"token": token}, settings.PROXY_TIMEOUT_S)
+        resp = await _post_json(url, {"token": token})
         resp.raise_for_status()
         return resp
     try:
-        resp = await _retry(call, settings.PROXY_RETRIES, settings.PROXY_RETRY_BACKOFF_S)
+        with pool.track(instance):
+            resp = await _retry(call, settings.PROXY_RETRIES, settings.PROXY_RETRY_BACKOFF_S)
         data = resp.json()
         return IntrospectResponse(**data)
     except Exception as e:
@@ -1,37 +1,38 @@
 import logging
 from fastapi import Request, HTTPException
+from typing import Optional
+from app.core.config import settings
 from app.core.security import get_bearer_token
+from app.schemas.auth import IntrospectResponse
+from app.services import activity_reporter
 from app.services.auth_client import introspect
+from app.services.jwt_verifier import verify_local
+from app.utils.logging import is_sampled
 
 logger = logging.getLogger("auth_guard")
 
-async def auth_required(request: Request):
-    # ===== Логируем данные запроса от фронта =====
-    try:
-        body = await request.body()
-        body_str = body.decode("utf-8") if body else None
-    except Exception:
-        body_str = "<cannot read body>"
-
-    logger.info(
-        "Incoming request: %s %s | Query: %s | Headers: %s | Body: %s",
-        request.method,
-        request.url.path,
-        dict(request.query_params),
-        dict(request.headers),
-        body_str
-    )
 
+async def _resolve_token(token: str) -> Optional[IntrospectResponse]:
+    if settings.AUTH_MODE == "introspect":
+        return await introspect(token)
+
+    data = verify_local(token)
+    if data is None and settings.AUTH_MODE == "hybrid":
+        return await introspect(token)
+    return data
+
+
+async def auth_required(request: Request):
     # ===== Проверка токена =====
     token = get_bearer_token(request)
     if not token:
         logger.warning("Missing bearer token")
         raise HTTPException(status_code=401, detail="Missing bearer token")
 
-    data = await introspect(token)
+    data = await _resolve_token(token)
 
     if not data or not data.active:
-        logger.warning("Invalid token: %s", data)
+        logger.info("Invalid token (active=%s)", getattr(data, "active", None))
         raise HTTPException(status_code=401, detail="Invalid token")
 
     # ===== Сохраняем пользователя в request.state =====
@@ -39,7 +40,9 @@ async def auth_required(request: Request):
     user_id = str(data.user_id) if hasattr(data, "user_id") else None
     roles = getattr(data, "roles", [])
     request.state.user = {"user_id": user_id, "roles": roles}
+    activity_reporter.record(user_id)
 
-    logger.info("Authenticated user: %s", request.state.user)
+    if logger.isEnabledFor(logging.DEBUG) and is_sampled(getattr(request.state, "request_id", None)):
+        logger.debug("Authenticated user: %s", request.state.user)
 
     return request.state.user
@@ -0,0 +1,143 @@
+# app/services/balancer.py
+import asyncio
+import logging
+import random
+from contextlib import contextmanager
+from typing import Collection, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.circuit_breaker import get_breaker, upstream_name
+
+log = logging.getLogger(__name__)
+
+
+def split_urls(base_url) -> List[str]:
+    """Настройка *_SERVICE_URL может содержать несколько инстансов через запятую."""
+    return [u.strip() for u in str(base_url).split(",") if u.strip()]
+
+
+class Instance:
+    def __init__(self, url: str):
+        self.url = url
+        self.name = upstream_name(url)
+        self.healthy = True
+        self.outstanding = 0
+        self.failures = 0
+        self.successes = 0
+
+    def available(self) -> bool:
+        return self.healthy and get_breaker(self.url).accepting()
+
+    def snapshot(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "circuit": get_breaker(self.url).state,
+        }
+
+
+class UpstreamPool:
+    """
+    Набор инстансов одного сервиса. Выбор — power-of-two-choices или least outstanding
+    среди здоровых инстансов, чей circuit breaker пропускает запросы (закрыт или ждёт пробы).
+    """
+
+    def __init__(self, urls: List[str]):
+        self.instances = [Instance(u) for u in urls]
+
+    def pick(self, exclude: Collection[Instance] = ()) -> Instance:
+        """exclude — инстансы, на которых этот запрос уже упал (ретрай идёт на другой)."""
+        if len(self.instances) == 1:
+            return self.instances[0]
+        candidates = [i for i in self.instances if i.available() and i not in exclude]
+        if not candidates:
+            candidates = [i for i in self.instances if i not in exclude]
+        if not candidates:
+            # Все выброшены — лучше попробовать, чем гарантированно отказать
+            candidates = self.instances
+        if len(candidates) == 1:
+            return candidates[0]
+        if settings.LB_STRATEGY == "least":
+            return min(candidates, key=lambda i: i.outstanding)
+        a, b = random.sample(candidates, 2)
+        return a if a.outstanding <= b.outstanding else b
+
+    @contextmanager
+    def track(self, instance: Instance):
+        instance.outstanding += 1
+        try:
+            yield instance
+        finally:
+            instance.outstanding -= 1
+
+
+_POOLS: Dict[str, UpstreamPool] = {}
+
+
+def get_pool(base_url) -> UpstreamPool:
+    key = str(base_url).strip()
+    pool = _POOLS.get(key)
+    if pool is None:
+        pool = _POOLS[key] = UpstreamPool(split_urls(key))
+    return pool
+
+
+def snapshot() -> dict:
+    return {key: [i.snapshot() for i in pool.instances] for key, pool in _POOLS.items()}
+
+
+async def _probe(client: httpx.AsyncClient, instance: Instance) -> None:
+    url = instance.url.rstrip("/") + settings.LB_HEALTH_PATH
+    try:
+        resp = await client.get(url)
+        ok = resp.status_code < 500
+    except httpx.HTTPError:
+        ok = False
+
+    if ok:
+        instance.failures = 0
+        instance.successes += 1
+        if not instance.healthy and instance.successes >= settings.LB_HEALTHY_THRESHOLD:
+            instance.healthy = True
+            log.info("Upstream instance %s readmitted", instance.url)
+    else:
+        instance.successes = 0
+        instance.failures += 1
+        if instance.healthy and instance.failures >= settings.LB_UNHEALTHY_THRESHOLD:
+            instance.healthy = False
+            log.warning("Upstream instance %s ejected after %d failed health checks", instance.url, instance.failures)
+
+
+async def health_check_loop(base_urls: List[str]) -> None:
+    """Фоновые активные проверки /health; пулы с одним инстансом не проверяются."""
+    pools = [get_pool(u) for u in base_urls]
+    pools = [p for p in pools if len(p.instances) > 1]
+    if not pools:
+        return
+    async with httpx.AsyncClient(timeout=settings.LB_HEALTH_TIMEOUT_S) as client:
+        while True:
+            await asyncio.gather(*(_probe(client, i) for p in pools for i in p.instances))
+            await asyncio.sleep(settings.LB_HEALTH_INTERVAL_S)
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start_health_checks(base_urls: List[str]) -> None:
+    global _task
+    if _task is None:
+        _task = asyncio.create_task(health_check_loop(base_urls))
+
+
+async def stop_health_checks() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
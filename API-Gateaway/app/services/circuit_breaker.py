@@ -0,0 +1,140 @@
+# app/services/circuit_breaker.py
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UpstreamUnavailable(Exception):
+    """Апстрим недоступен: цепь разомкнута или bulkhead переполнен."""
+
+    def __init__(self, upstream: str, reason: str, retry_after: float = 1.0):
+        super().__init__(f"{upstream}: {reason}")
+        self.upstream = upstream
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker + bulkhead на один апстрим.
+    closed → (N ошибок подряд) → open → (через BREAKER_OPEN_S) → half_open → успех → closed.
+    Bulkhead ограничивает число одновременных запросов, чтобы медленный сервис
+    не занял весь общий пул соединений прокси.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.half_open_in_flight = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_concurrent = settings.BULKHEAD_MAX_CONCURRENT
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+
+    def _retry_after(self) -> float:
+        return max(0.0, self.opened_at + settings.BREAKER_OPEN_S - time.monotonic())
+
+    def _allow(self) -> bool:
+        if self.state == OPEN:
+            if self._retry_after() > 0:
+                return False
+            self.state = HALF_OPEN
+            self.half_open_in_flight = 0
+            log.info("Circuit %s half-open", self.name)
+        if self.state == HALF_OPEN:
+            if self.half_open_in_flight >= settings.BREAKER_HALF_OPEN_MAX:
+                return False
+            self.half_open_in_flight += 1
+        return True
+
+    def accepting(self) -> bool:
+        """
+        Пропустит ли цепь запрос сейчас — без смены состояния (для выбора инстанса).
+        Open, у которого истёк BREAKER_OPEN_S, считается пропускающим: первый же выбранный
+        запрос переведёт его в half_open, иначе выброшенный инстанс не вернулся бы никогда.
+        """
+        if self.state == OPEN:
+            return self._retry_after() <= 0
+        if self.state == HALF_OPEN:
+            return self.half_open_in_flight < settings.BREAKER_HALF_OPEN_MAX
+        return True
+
+    def record_success(self) -> None:
+        if self.state != CLOSED:
+            log.info("Circuit %s closed", self.name)
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= settings.BREAKER_FAILURE_THRESHOLD:
+            if self.state != OPEN:
+                log.warning("Circuit %s open after %d failures", self.name, self.failures)
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+
+    @asynccontextmanager
+    async def guard(self):
+        """Проверка цепи и слот bulkhead на время запроса. Исход сообщает вызывающий."""
+        if not self._allow():
+            self.rejected += 1
+            raise UpstreamUnavailable(self.name, "circuit open", self._retry_after() or 1.0)
+        probing = self.state == HALF_OPEN
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), timeout=settings.BULKHEAD_WAIT_S)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise UpstreamUnavailable(self.name, "bulkhead full")
+            self.in_flight += 1
+            try:
+                yield self
+            finally:
+                self.in_flight -= 1
+                self._slots.release()
+        finally:
+            if probing:
+                self.half_open_in_flight -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "in_flight": self.in_flight,
+            "max_concurrent": self.max_concurrent,
+            "rejected": self.rejected,
+            "retry_after_s": round(self._retry_after(), 2) if self.state == OPEN else 0.0,
+        }
+
+
+_BREAKERS: Dict[str, CircuitBreaker] = {}
+
+
+def upstream_name(base_url) -> str:
+    parts = urlsplit(str(base_url).strip())
+    return parts.netloc or str(base_url)
+
+
+def get_breaker(base_url) -> CircuitBreaker:
+    name = upstream_name(base_url)
+    breaker = _BREAKERS.get(name)
+    if breaker is None:
+        breaker = _BREAKERS[name] = CircuitBreaker(name)
+    return breaker
+
+
+def snapshot() -> dict:
+    return {name: b.snapshot() for name, b in _BREAKERS.items()}
@@ -0,0 +1,143 @@
+# app/services/hedging.py
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from app.core.config import settings
+from app.utils import metrics
+
+log = logging.getLogger(__name__)
+
+_PATTERNS = [re.compile(p) for p in settings.PROXY_HEDGE_PATHS]
+# Сегменты-идентификаторы: число или UUID/hex
+_ID_SEGMENT = re.compile(r"^(\d+|[0-9a-fA-F]{8}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{4}-?[0-9a-fA-F]{12})$")
+
+
+def hedge_key(path: str) -> Optional[str]:
+    """
+    Ключ хеджера для пути или None, если путь не подпадает под PROXY_HEDGE_PATHS.
+    Ключ — шаблон пути с {id} вместо идентификаторов (/api/catalog/books/42 → /api/catalog/books/{id}):
+    маршруты гейтвея — catch-all, и по ним все эндпоинты сервиса делили бы одну статистику и бюджет.
+    Сверх PROXY_HEDGE_MAX_ROUTES новых шаблонов ключом становится совпавший паттерн.
+    """
+    pattern = next((p for p in _PATTERNS if p.match(path)), None)
+    if pattern is None:
+        return None
+    template = "/".join("{id}" if _ID_SEGMENT.match(seg) else seg for seg in path.rstrip("/").split("/"))
+    if template not in _HEDGERS and len(_HEDGERS) >= settings.PROXY_HEDGE_MAX_ROUTES:
+        return pattern.pattern
+    return template
+
+
+class Hedger:
+    """
+    Состояние хеджирования одного маршрута (шаблона пути, см. hedge_key).
+    Задержка второй попытки — перцентиль последних PROXY_HEDGE_WINDOW ответов;
+    бюджет — токены: каждый запрос добавляет PROXY_HEDGE_BUDGET_RATIO, каждый хедж тратит 1,
+    так что доля лишних запросов в апстрим не превышает этого отношения.
+    """
+
+    def __init__(self, route: str):
+        self.route = route
+        self._samples = deque(maxlen=settings.PROXY_HEDGE_WINDOW)
+        self._tokens = float(settings.PROXY_HEDGE_BUDGET_BURST)
+        self.sent = 0
+        self.won = 0
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def delay(self) -> Optional[float]:
+        """Через сколько секунд слать вторую попытку; None — статистики пока мало."""
+        if len(self._samples) < settings.PROXY_HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._samples)
+        idx = min(len(ordered) - 1, int(len(ordered) * settings.PROXY_HEDGE_PERCENTILE))
+        return max(ordered[idx], settings.PROXY_HEDGE_MIN_DELAY_S)
+
+    def _earn(self) -> None:
+        self._tokens = min(
+            self._tokens + settings.PROXY_HEDGE_BUDGET_RATIO, float(settings.PROXY_HEDGE_BUDGET_BURST)
+        )
+
+    def _spend(self) -> bool:
+        if self._tokens < 1.0:
+            return False
+        self._tokens -= 1.0
+        return True
+
+    async def run(self, fetch):
+        """
+        Выполняет fetch(); если за delay() ответа нет и бюджет позволяет — запускает
+        вторую попытку и берёт первый успешный ответ, проигравшую отменяет.
+        """
+        self._earn()
+        delay = self.delay()
+        started = time.perf_counter()
+        if delay is None:
+            resp = await fetch()
+            self.observe(time.perf_counter() - started)
+            return resp
+
+        primary = asyncio.ensure_future(fetch())
+        hedge = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if done:
+                resp = primary.result()
+                self.observe(time.perf_counter() - started)
+                return resp
+            if not self._spend():
+                metrics.UPSTREAM_HEDGES.labels(self.route, "budget_exhausted").inc()
+                resp = await primary
+                self.observe(time.perf_counter() - started)
+                return resp
+
+            self.sent += 1
+            metrics.UPSTREAM_HEDGES.labels(self.route, "sent").inc()
+            hedge = asyncio.ensure_future(fetch())
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        error = error or task.exception()
+                        continue
+                    if task is hedge:
+                        self.won += 1
+                        metrics.UPSTREAM_HEDGES.labels(self.route, "won").inc()
+                    self.observe(time.perf_counter() - started)
+                    return task.result()
+            raise error
+        finally:
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> dict:
+        delay = self.delay()
+        return {
+            "samples": len(self._samples),
+            "delay_s": round(delay, 4) if delay is not None else None,
+            "tokens": round(self._tokens, 2),
+            "sent": self.sent,
+            "won": self.won,
+        }
+
+
+_HEDGERS: Dict[str, Hedger] = {}
+
+
+def get_hedger(route: str) -> Hedger:
+    hedger = _HEDGERS.get(route)
+    if hedger is None:
+        hedger = _HEDGERS[route] = Hedger(route)
+    return hedger
+
+
+def snapshot() -> dict:
+    return {route: h.snapshot() for route, h in _HEDGERS.items()}
@@ -0,0 +1,122 @@
+# app/services/jwt_verifier.py
+import asyncio
+import logging
+from typing import Dict, Optional, Tuple
+
+import httpx
+import jwt
+
+from app.core.config import settings
+from app.schemas.auth import IntrospectResponse
+from app.services import auth_client
+
+log = logging.getLogger(__name__)
+
+_INACTIVE = IntrospectResponse(active=False)
+
+
+# kid -> ключ из JWKS AuthService; держит актуальным фоновая задача jwks_refresh_loop
+_jwks: Dict[str, jwt.PyJWK] = {}
+_JWKS_MIN_REFRESH_S = 10.0   # незнакомые kid не должны превращаться в поток запросов к AuthService
+_refresh_wanted = asyncio.Event()
+_task: Optional[asyncio.Task] = None
+
+
+async def refresh_jwks() -> None:
+    global _jwks
+    try:
+        resp = await auth_client.get_client().get(settings.JWT_JWKS_URL)
+        resp.raise_for_status()
+        _jwks = {k["kid"]: jwt.PyJWK(k) for k in resp.json().get("keys", []) if k.get("kid")}
+    except (httpx.HTTPError, ValueError, KeyError, jwt.PyJWKError) as e:
+        # Остаёмся на прежнем наборе ключей
+        log.warning("JWKS refresh failed: %s", e)
+
+
+async def jwks_refresh_loop() -> None:
+    """Перечитывает JWKS раз в JWT_JWKS_REFRESH_S или раньше — при токене с незнакомым kid."""
+    while True:
+        await refresh_jwks()
+        await asyncio.sleep(_JWKS_MIN_REFRESH_S)
+        _refresh_wanted.clear()
+        try:
+            await asyncio.wait_for(_refresh_wanted.wait(), max(0.0, settings.JWT_JWKS_REFRESH_S - _JWKS_MIN_REFRESH_S))
+        except asyncio.TimeoutError:
+            pass
+
+
+def start_jwks_refresh() -> None:
+    global _task
+    if settings.JWT_JWKS_URL and _task is None:
+        _task = asyncio.create_task(jwks_refresh_loop())
+
+
+async def stop_jwks_refresh() -> None:
+    global _task
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def _verification_key(token: str) -> Optional[Tuple[object, str]]:
+    # Токен с kid при настроенном JWKS — ключ и алгоритм из JWKS (не из заголовка токена)
+    if settings.JWT_JWKS_URL:
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+        except jwt.DecodeError:
+            return None
+        if kid:
+            key = _jwks.get(kid)
+            if key is None:
+                _refresh_wanted.set()
+                return None
+            return key.key, key.algorithm_name
+    # HS* — общий секрет с AuthService, RS*/ES*/EdDSA — опубликованный публичный ключ
+    if settings.JWT_ALG.upper().startswith("HS"):
+        key = settings.JWT_SECRET_KEY
+    else:
+        key = settings.JWT_PUBLIC_KEY
+    return (key, settings.JWT_ALG) if key else None
+
+
+def verify_local(token: str) -> Optional[IntrospectResponse]:
+    """
+    Проверяет access-токен без похода в AuthService.
+    Возвращает None, если локально решить нельзя (нет ключа, чужая подпись/алгоритм) —
+    тогда в режиме hybrid решение остаётся за introspect.
+    """
+    found = _verification_key(token)
+    if found is None:
+        return None
+    key, alg = found
+
+    try:
+        payload = jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            options={"require": ["exp", "sub"]},
+            leeway=settings.JWT_LEEWAY_S,
+        )
+    except jwt.ExpiredSignatureError:
+        return _INACTIVE
+    except (jwt.InvalidSignatureError, jwt.InvalidAlgorithmError) as e:
+        log.debug("Local JWT verification inconclusive: %s", e)
+        return None
+    except jwt.InvalidTokenError as e:
+        log.debug("Local JWT verification failed: %s", e)
+        return _INACTIVE
+
+    if payload.get("typ") != "access":
+        return _INACTIVE
+
+    return IntrospectResponse(
+        active=True,
+        user_id=payload["sub"],
+        roles=payload.get("roles") or [],
+        exp=payload.get("exp"),
+    )
@@ -1,24 +1,55 @@
 # app/services/proxy.py
 import asyncio
 import logging
-from typing import Iterable, Mapping
+import math
+import re
+import time
+from typing import Dict, Iterable, Mapping
 from urllib.parse import urljoin
 
+import anyio
 import httpx
 from fastapi import Request
 from starlette.responses import StreamingResponse, Response
 
 from app.core.config import settings
+from app.services.balancer import get_pool
+from app.services.circuit_breaker import UpstreamUnavailable, get_breaker
+from app.services.hedging import get_hedger, hedge_key
+from app.utils import metrics
+from app.utils.logging import is_sampled
 
 log = logging.getLogger(__name__)
 
+async def _mark_start(request: httpx.Request):
+    request.extensions["gateway_start"] = time.perf_counter()
+
+
+async def _observe_ttfb(response: httpx.Response):
+    # Хук срабатывает, когда получены заголовки, до чтения тела
+    start = response.request.extensions.get("gateway_start")
+    if start is not None:
+        upstream = response.request.url.netloc.decode("ascii")
+        metrics.UPSTREAM_TTFB.labels(upstream).observe(time.perf_counter() - start)
+
+
 _CLIENT = httpx.AsyncClient(
     timeout=httpx.Timeout(settings.PROXY_TIMEOUT_S),
     limits=httpx.Limits(max_keepalive_connections=100, max_connections=200),
     follow_redirects=False,
+    event_hooks={"request": [_mark_start], "response": [_observe_ttfb]},
 )
 
 
+# Длинные ответы (файлы, SSE): отдельный профиль таймаутов. read — максимум тишины
+# между чанками, а не длительность всей передачи; ожидание заголовков ограничивается отдельно
+_STREAM_TIMEOUT = httpx.Timeout(
+    settings.PROXY_TIMEOUT_S,
+    read=settings.PROXY_STREAM_IDLE_TIMEOUT_S,
+)
+_STREAM_PATTERNS = [re.compile(p) for p in settings.PROXY_STREAM_PATHS]
+
+
 _HOP_BY_HOP = {
     "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
     "te", "trailer", "transfer-encoding", "upgrade",
@@ -33,13 +64,9 @@ def _filtered_headers(request: Request) -> dict:
     excluded = {"host", "content-length"}
     h = {k: v for k, v in request.headers.items() if k.lower() not in excluded}
 
-    # Проверяем Authorization
     auth = request.headers.get("authorization")
     if auth:
         h["Authorization"] = auth
-        log.debug("Authorization token present: %s", auth[:10] + "…")  # показываем только начало токена
-    else:
-        log.warning("Authorization token missing in incoming request!")
 
     rid = getattr(request.state, "request_id", None)
     if rid:
@@ -61,10 +88,15 @@ def _filtered_headers(request: Request) -> dict:
     h["X-Forwarded-Proto"] = proto
     h["X-Forwarded-Host"] = host
 
+    # Сжатие для клиента делает гейтвей (CompressionMiddleware), между гейтвеем и сервисами — без него
+    for k in [k for k in h if k.lower() == "accept-encoding"]:
+        del h[k]
+    h["Accept-Encoding"] = "identity"
+
     return _strip_hop_by_hop(h)
 
 
-async def _retry(call, retries: int, backoff: float, method: str):
+async def _retry(call, retries: int, backoff: float, method: str, upstream: str = ""):
     """
     Ретрии: только на сетевые ошибки/таймауты.
     Для небезопасных методов (POST/PUT/...), ретраим только при сетевых исключениях (и то аккуратно).
@@ -78,6 +110,7 @@ async def _retry(call, retries: int, backoff: float, method: str):
                 raise
             delay = backoff * (2 ** attempt) + (0.1 * backoff) * (attempt + 1) * asyncio.get_event_loop().time() % 0.1
             log.warning("Upstream %s failed (%s). Retry %d in %.2fs", method, e.__class__.__name__, attempt + 1, delay)
+            metrics.UPSTREAM_RETRIES.labels(upstream).inc()
             await asyncio.sleep(delay)
             attempt += 1
 
@@ -93,51 +126,233 @@ def _join_url(base_url, path: str, query: str) -> str:
     return url
 
 
-async def forward(request: Request, base_url: str, path_suffix: str = "") -> Response:
+# Ответы апстрима, которые считаются отказом для circuit breaker
+_BREAKER_FAILURE_STATUSES = {502, 503, 504}
+
+_SAFE_METHODS = {"GET", "HEAD"}
+
+# Single-flight: ключ -> задача, которая уже идёт в апстрим за тем же ответом
+_INFLIGHT: Dict[str, asyncio.Task] = {}
+
+
+def _coalesce_key(method: str, target: str, request: Request) -> str:
+    # Заголовки из списка входят в ключ: без Authorization разные пользователи
+    # получили бы один и тот же ответ
+    parts = [method, target]
+    parts += [f"{h}={request.headers.get(h, '')}" for h in settings.PROXY_COALESCE_HEADERS]
+    return "\n".join(parts)
+
+
+async def _single_flight(key: str, fetch):
     """
-    Прокси в апстрим. Логирует всё от фронтенда и форвардит запрос.
+    Одинаковые одновременные запросы делят один поход в апстрим.
+    Ответ httpx уже прочитан целиком, поэтому каждый ожидающий может отдать его тело сам.
+    Запрос выполняется отдельной задачей: отключение первого клиента не отменяет его для остальных.
     """
-    # --- Логируем запрос от фронтенда ---
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = asyncio.ensure_future(fetch())
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _t: _INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def _streaming(request: Request) -> bool:
+    """Ответ может быть большим или долгим — не буферизуем его и не держим под общим таймаутом."""
+    if "range" in request.headers:
+        return True
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return True
+    return any(p.match(request.url.path) for p in _STREAM_PATTERNS)
+
+
+class _UpstreamStreamingResponse(StreamingResponse):
+    """
+    Стрим ответа апстрима клиенту. Соединение с апстримом закрывается при любом исходе:
+    конец тела, ошибка, отключение клиента (отмена задачи или OSError от send).
+    """
+
+    def __init__(self, upstream: httpx.Response, **kwargs):
+        super().__init__(**kwargs)
+        self._upstream = upstream
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            if not self._upstream.is_closed:
+                log.debug("Client went away, closing upstream stream %s", self._upstream.request.url)
+            # Закрытие не должно быть прервано той же отменой, что прервала отдачу
+            with anyio.CancelScope(shield=True):
+                await self._upstream.aclose()
+
+
+_BODYLESS_METHODS = {"GET", "HEAD", "OPTIONS", "DELETE"}
+
+
+def _content_length(request: Request):
+    raw = request.headers.get("content-length")
+    if raw is None:
+        return None
     try:
-        body_bytes = await request.body()
-        body_text = body_bytes.decode("utf-8") if body_bytes else "(empty)"
-    except Exception as e:
-        body_text = f"(error reading body: {e})"
+        return int(raw)
+    except ValueError:
+        return None
 
-    log.debug("=== Incoming request from frontend ===")
-    log.debug(f"Method: {request.method}")
-    log.debug(f"URL: {request.url}")
-    log.debug(f"Query params: {dict(request.query_params)}")
-    log.debug(f"Headers: {dict(request.headers)}")
-    log.debug(f"Body: {body_text}")
-    log.debug("======================================")
+
+async def _request_content(request: Request):
+    """
+    Возвращает (content, replayable, length).
+    Маленькие тела (<= PROXY_REPLAY_MAX_BYTES) буферизуем — их можно переотправить при ретрае.
+    Всё остальное отдаём в httpx как async-итератор request.stream(): байты уходят в апстрим
+    по мере чтения от клиента, память гейтвея не растёт с размером загрузки.
+    """
+    length = _content_length(request)
+    chunked = "chunked" in request.headers.get("transfer-encoding", "").lower()
+
+    if length is None and not chunked and request.method in _BODYLESS_METHODS:
+        return b"", True, 0
+
+    small = length is not None and length <= settings.PROXY_REPLAY_MAX_BYTES
+    # Тело уже прочитано (например, зависимостью) — стримить нечего
+    already_read = getattr(request, "_body", None) is not None
+    if small or already_read or not settings.PROXY_STREAM_BODY:
+        body = await request.body()
+        return body, True, len(body)
+
+    return request.stream(), False, length
+
+
+async def forward(request: Request, base_url: str, path_suffix: str = "") -> Response:
+    """
+    Прокси в апстрим. Тело запроса стримится, если оно слишком большое для буфера ретраев,
+    и никогда не читается ради логов.
+    """
+    content, replayable, length = await _request_content(request)
 
     # --- Формируем upstream URL и заголовки ---
     upstream_path = path_suffix or request.url.path
-    # Ensure base_url is clean (no stray spaces)
-    target = _join_url(str(base_url).strip(), upstream_path, request.url.query)
+    pool = get_pool(base_url)
+    # Логический адрес (первый инстанс) — для логов и ключа single-flight;
+    # конкретный инстанс выбирается балансировщиком в send()
+    target = _join_url(pool.instances[0].url, upstream_path, request.url.query)
     headers = _filtered_headers(request)
+    if not replayable and length is not None:
+        # Сохраняем Content-Length, чтобы httpx не переключался на chunked
+        headers["Content-Length"] = str(length)
 
-    # Логируем, что уйдёт в апстрим
-    log.debug("=== Forwarding to upstream ===")
-    log.debug(f"Target URL: {target}")
-    log.debug(f"Method: {request.method}")
-    log.debug(f"Headers: {headers}")
-    log.debug(f"Body length: {len(body_bytes)} bytes")
-    log.debug("=================================")
-
-    async def call():
-        return await _CLIENT.request(
-            method=request.method,
-            url=target,
-            headers=headers,
-            content=body_bytes
+    # Подробности — только для сэмплированных запросов; тело и заголовки не логируем
+    if log.isEnabledFor(logging.DEBUG) and is_sampled(getattr(request.state, "request_id", None)):
+        log.debug(
+            "Forward %s %s -> %s | body=%s bytes streamed=%s",
+            request.method, request.url.path, target,
+            length if length is not None else "unknown", not replayable,
         )
 
+    # Стрим можно прочитать только один раз — ретраи возможны лишь для буферизованного тела
+    retries = settings.PROXY_RETRIES if replayable else 0
+    streaming = _streaming(request)
+
+    async def attempt(instance) -> httpx.Response:
+        upstream = instance.name
+        url = _join_url(instance.url, upstream_path, request.url.query)
+
+        async def call():
+            if streaming:
+                req = _CLIENT.build_request(
+                    request.method, url, headers=headers, content=content, timeout=_STREAM_TIMEOUT
+                )
+                # Тело не читаем: отдаём его клиенту по мере поступления
+                return await asyncio.wait_for(
+                    _CLIENT.send(req, stream=True), settings.PROXY_STREAM_HEADERS_TIMEOUT_S
+                )
+            return await _CLIENT.request(
+                method=request.method,
+                url=url,
+                headers=headers,
+                content=content
+            )
+
+        breaker = get_breaker(instance.url)
+        async with breaker.guard():
+            started = time.perf_counter()
+            in_flight = metrics.UPSTREAM_IN_FLIGHT.labels(upstream)
+            in_flight.inc()
+            try:
+                with pool.track(instance):
+                    resp = await call()
+            except Exception:
+                breaker.record_failure()
+                metrics.UPSTREAM_DURATION.labels(upstream, "error").observe(time.perf_counter() - started)
+                raise
+            finally:
+                in_flight.dec()
+            if resp.status_code in _BREAKER_FAILURE_STATUSES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            outcome = "5xx" if resp.status_code >= 500 else "ok"
+            metrics.UPSTREAM_DURATION.labels(upstream, outcome).observe(time.perf_counter() - started)
+            return resp
+
+    async def send():
+        # Каждая попытка выбирает инстанс заново, минуя те, где запрос уже упал:
+        # иначе до health-проверки все ретраи уходили бы в тот же мёртвый инстанс
+        failed = []
+
+        async def call():
+            instance = pool.pick(exclude=failed)
+            try:
+                return await attempt(instance)
+            except (httpx.ConnectError, httpx.ReadTimeout, httpx.NetworkError):
+                failed.append(instance)
+                raise
+
+        return await _retry(call, retries, settings.PROXY_RETRY_BACKOFF_S, request.method, pool.instances[0].name)
+
+    # Стримы не хеджируем и не склеиваем: их тело читается один раз и одним клиентом
+    idempotent = request.method in _SAFE_METHODS and replayable and not content and not streaming
+    fetch = send
+    route = hedge_key(request.url.path) if settings.PROXY_HEDGE_ENABLED and idempotent else None
+    if route is not None:
+        hedger = get_hedger(route)
+
+        async def fetch():
+            return await hedger.run(send)
+
     try:
-        resp = await _retry(call, settings.PROXY_RETRIES, settings.PROXY_RETRY_BACKOFF_S, request.method)
+        if settings.PROXY_COALESCE_ENABLED and idempotent:
+            resp = await _single_flight(_coalesce_key(request.method, target, request), fetch)
+        else:
+            resp = await fetch()
 
         response_headers = _strip_hop_by_hop(resp.headers)
+        if streaming:
+            # Сырые байты как есть: Content-Length, Content-Range и 206 доходят до клиента без изменений
+            async def _raw():
+                try:
+                    async for chunk in resp.aiter_raw():
+                        yield chunk
+                except httpx.HTTPError as e:
+                    log.warning("Upstream stream %s aborted: %s", target, e.__class__.__name__)
+                    raise
+                finally:
+                    await resp.aclose()
+
+            return _UpstreamStreamingResponse(
+                resp,
+                content=_raw(),
+                status_code=resp.status_code,
+                headers=response_headers,
+                media_type=resp.headers.get("content-type"),
+            )
+
+        if "content-encoding" in resp.headers:
+            # aiter_bytes() отдаёт уже раскодированное тело — старые длина и кодировка неверны
+            response_headers = {
+                k: v for k, v in response_headers.items()
+                if k.lower() not in ("content-encoding", "content-length")
+            }
 
         async def _aiter():
             async for chunk in resp.aiter_bytes():
@@ -150,6 +365,16 @@ async def forward(request: Request, base_url: str, path_suffix: str = "") -> Res
             media_type=resp.headers.get("content-type")
         )
 
+    except UpstreamUnavailable as e:
+        # Быстрый отказ: не ждём таймаута на заведомо больном апстриме
+        log.warning("Upstream unavailable: %s", e)
+        return Response(
+            content=b'{"detail":"Upstream unavailable"}',
+            status_code=503,
+            media_type="application/json",
+            headers={"Cache-Control": "no-store", "Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+
     except Exception as e:
         log.error("Proxy error to %s: %s", target, e)
         return Response(
@@ -0,0 +1,333 @@
+# app/services/response_cache.py
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+
+from cachetools import TLRUCache
+from fastapi import Request
+from starlette.responses import Response
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.proxy import forward
+
+log = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "rc:"
+# Канал сброса: у каждого воркера своя память, Redis-ключей удаления ей мало
+_INVALIDATE_CHANNEL = "rc:invalidate"
+# Заголовки, которые не храним: пересчитываются при отдаче или относятся к соединению
+_SKIP_HEADERS = {"content-length", "date", "x-request-id", "set-cookie"}
+_MAX_AGE_RE = re.compile(r"(?:s-maxage|max-age)\s*=\s*(\d+)")
+
+
+@dataclass
+class CachedResponse:
+    status_code: int
+    headers: Dict[str, str]
+    body: bytes
+    etag: str
+    stored_at: float
+    expires_at: float
+    vary: Tuple[str, ...] = field(default_factory=tuple)
+
+    def dumps(self) -> bytes:
+        meta = {
+            "status_code": self.status_code,
+            "headers": self.headers,
+            "etag": self.etag,
+            "stored_at": self.stored_at,
+            "expires_at": self.expires_at,
+            "vary": list(self.vary),
+        }
+        return json.dumps(meta).encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, raw: bytes) -> "CachedResponse":
+        meta, body = raw.split(b"\n", 1)
+        data = json.loads(meta)
+        data["vary"] = tuple(data["vary"])
+        return cls(body=body, **data)
+
+
+def _cache_control(value: Optional[str]) -> set:
+    return {d.strip().lower() for d in (value or "").split(",") if d.strip()}
+
+
+def _ttl_from_response(resp_headers) -> Optional[float]:
+    """TTL по Cache-Control апстрима; None — ответ кэшировать нельзя."""
+    cc = resp_headers.get("cache-control", "")
+    directives = _cache_control(cc)
+    if directives & {"no-store", "private", "no-cache"}:
+        return None
+    if "set-cookie" in resp_headers:
+        return None
+    vary = resp_headers.get("vary", "")
+    if "*" in vary:
+        return None
+    m = _MAX_AGE_RE.search(cc.lower())
+    ttl = float(m.group(1)) if m else settings.RESPONSE_CACHE_DEFAULT_TTL_S
+    return min(ttl, settings.RESPONSE_CACHE_MAX_TTL_S) if ttl > 0 else None
+
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Слабое сравнение (RFC 9110): W/ префикс не учитываем
+    bare = etag.removeprefix("W/")
+    return any(t.strip().removeprefix("W/") == bare for t in if_none_match.split(","))
+
+
+class ResponseCache:
+    """
+    Общий кэш ответов для публичных GET каталога: память процесса + опционально Redis.
+    Уважает Cache-Control/Vary апстрима, выдаёт ETag и отвечает 304 на If-None-Match.
+    Кэшируются только пути из RESPONSE_CACHE_PATHS — они не зависят от пользователя,
+    поэтому Authorization в ключ не входит.
+    С RESPONSE_CACHE_REDIS сброс рассылается остальным воркерам через pub/sub.
+    """
+
+    def __init__(self, maxsize: int):
+        self._memory = TLRUCache(maxsize=maxsize, ttu=lambda _k, v, _now: v.expires_at, timer=time.time)
+        # base key -> (заголовки из Vary последнего ответа апстрима, когда истекает та запись).
+        # Ключ содержит клиентский query string — держим тот же предел и TTL, что у записей
+        self._vary = TLRUCache(maxsize=maxsize, ttu=lambda _k, v, _now: v[1], timer=time.time)
+        self._patterns = [re.compile(p) for p in settings.RESPONSE_CACHE_PATHS]
+        self._invalidate_patterns = [re.compile(p) for p in settings.RESPONSE_CACHE_INVALIDATE_PATHS]
+        self._origin = uuid.uuid4().hex
+        self._listener: Optional[asyncio.Task] = None
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, request: Request) -> bool:
+        if request.method not in ("GET", "HEAD"):
+            return False
+        path = request.url.path
+        return any(p.match(path) for p in self._patterns)
+
+    @staticmethod
+    def _base_key(request: Request) -> str:
+        query = "&".join(sorted(request.url.query.split("&"))) if request.url.query else ""
+        return f"{request.url.path}?{query}"
+
+    @staticmethod
+    def _full_key(base: str, vary: Tuple[str, ...], request: Request) -> str:
+        if not vary:
+            return base
+        values = "|".join(f"{h}={request.headers.get(h, '')}" for h in vary)
+        return base + "#" + hashlib.sha1(values.encode("utf-8")).hexdigest()
+
+    async def _get(self, key: str) -> Optional[CachedResponse]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            return entry
+        redis = get_redis() if settings.RESPONSE_CACHE_REDIS else None
+        if redis is None:
+            return None
+        try:
+            raw = await redis.get(_REDIS_PREFIX + key)
+        except Exception as e:
+            log.warning("Response cache redis get failed: %s", e)
+            return None
+        if raw is None:
+            return None
+        entry = CachedResponse.loads(raw)
+        if entry.expires_at <= time.time():
+            return None
+        self._memory[key] = entry
+        return entry
+
+    async def _put(self, key: str, entry: CachedResponse) -> None:
+        self._memory[key] = entry
+        redis = get_redis() if settings.RESPONSE_CACHE_REDIS else None
+        if redis is None:
+            return
+        ttl_ms = int((entry.expires_at - time.time()) * 1000)
+        if ttl_ms <= 0:
+            return
+        try:
+            await redis.set(_REDIS_PREFIX + key, entry.dumps(), px=ttl_ms)
+        except Exception as e:
+            log.warning("Response cache redis set failed: %s", e)
+
+    def _drop_local(self, prefix: str) -> int:
+        keys = [k for k in list(self._memory.keys()) if k.startswith(prefix)]
+        for k in keys:
+            self._memory.pop(k, None)
+        for k in [k for k in self._vary if k.startswith(prefix)]:
+            self._vary.pop(k, None)
+        return len(keys)
+
+    async def invalidate(self, prefix: str) -> int:
+        """Удаляет все записи, путь которых начинается с prefix. Возвращает число удалённых в памяти."""
+        removed = self._drop_local(prefix)
+
+        redis = get_redis() if settings.RESPONSE_CACHE_REDIS else None
+        if redis is not None:
+            pattern = _REDIS_PREFIX + re.sub(r"([*?\[\]\\])", r"\\\1", prefix) + "*"
+            try:
+                batch = []
+                async for k in redis.scan_iter(match=pattern, count=500):
+                    batch.append(k)
+                    if len(batch) >= 500:
+                        await redis.unlink(*batch)
+                        batch = []
+                if batch:
+                    await redis.unlink(*batch)
+                # Публикуем после удаления из Redis: иначе другой воркер успеет перечитать старую запись
+                await redis.publish(_INVALIDATE_CHANNEL, json.dumps({"origin": self._origin, "prefix": prefix}))
+            except Exception as e:
+                log.warning("Response cache redis invalidate failed: %s", e)
+        return removed
+
+    async def _listen(self) -> None:
+        while True:
+            redis = get_redis()
+            if redis is None:
+                return
+            try:
+                pubsub = redis.pubsub()
+                await pubsub.subscribe(_INVALIDATE_CHANNEL)
+                try:
+                    while True:
+                        msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if msg is None:
+                            continue
+                        data = json.loads(msg["data"])
+                        if data["origin"] != self._origin:
+                            self._drop_local(data["prefix"])
+                finally:
+                    await pubsub.aclose()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Пока подписки не было, сбросы могли потеряться — память не доверяем
+                log.warning("Response cache invalidation listener failed: %s", e)
+                self._memory.clear()
+                self._vary.clear()
+                await asyncio.sleep(1.0)
+
+    def start_listener(self) -> None:
+        if settings.RESPONSE_CACHE_ENABLED and settings.RESPONSE_CACHE_REDIS and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop_listener(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self._memory.currsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def _respond(self, request: Request, entry: CachedResponse, status: str) -> Response:
+        headers = dict(entry.headers)
+        headers["ETag"] = entry.etag
+        headers["Age"] = str(max(0, int(time.time() - entry.stored_at)))
+        headers["X-Cache"] = status
+        if _etag_matches(request.headers.get("if-none-match"), entry.etag):
+            keep = {"etag", "cache-control", "vary", "age", "x-cache", "expires", "last-modified"}
+            return Response(status_code=304, headers={k: v for k, v in headers.items() if k.lower() in keep})
+        body = b"" if request.method == "HEAD" else entry.body
+        return Response(content=body, status_code=entry.status_code, headers=headers)
+
+    async def forward(
+        self,
+        request: Request,
+        base_url: str,
+        path_suffix: str = "",
+        invalidate_prefix: Optional[str] = None,
+    ) -> Response:
+        """
+        forward() с кэшем. invalidate_prefix — что сбросить после успешного изменяющего
+        запроса (POST/PUT/PATCH/DELETE), если его путь есть в RESPONSE_CACHE_INVALIDATE_PATHS.
+        """
+        if request.method not in ("GET", "HEAD"):
+            resp = await forward(request, base_url, path_suffix)
+            if (
+                invalidate_prefix
+                and resp.status_code < 400
+                and any(p.match(request.url.path) for p in self._invalidate_patterns)
+            ):
+                await self.invalidate(invalidate_prefix)
+            return resp
+
+        if not settings.RESPONSE_CACHE_ENABLED or not self.cacheable(request):
+            return await forward(request, base_url, path_suffix)
+
+        req_cc = _cache_control(request.headers.get("cache-control"))
+        # Частичные ответы не кэшируем и не собираем из полного: Range уходит в апстрим как есть
+        if "no-store" in req_cc or "range" in request.headers:
+            return await forward(request, base_url, path_suffix)
+
+        base = self._base_key(request)
+        if not req_cc & {"no-cache", "max-age=0"}:
+            vary, _ = self._vary.get(base, ((), 0.0))
+            entry = await self._get(self._full_key(base, vary, request))
+            if entry is not None:
+                self.hits += 1
+                return self._respond(request, entry, "HIT")
+        self.misses += 1
+
+        resp = await forward(request, base_url, path_suffix)
+        if resp.status_code != 200 or not hasattr(resp, "body_iterator"):
+            return resp
+
+        # Собираем тело; если оно больше лимита — отдаём как есть, без кэширования
+        chunks, size = [], 0
+        iterator = resp.body_iterator
+        async for chunk in iterator:
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > settings.RESPONSE_CACHE_MAX_BODY_BYTES:
+                break
+        else:
+            body = b"".join(chunks)
+            ttl = _ttl_from_response(resp.headers)
+            if ttl is None:
+                headers = {k: v for k, v in resp.headers.items() if k.lower() != "content-length"}
+                return Response(content=body, status_code=resp.status_code, headers=headers)
+
+            vary = tuple(sorted(h.strip().lower() for h in resp.headers.get("vary", "").split(",") if h.strip()))
+            now = time.time()
+            self._vary[base] = (vary, now + ttl)
+            entry = CachedResponse(
+                status_code=resp.status_code,
+                headers={k: v for k, v in resp.headers.items() if k.lower() not in _SKIP_HEADERS | {"etag"}},
+                body=body,
+                etag=resp.headers.get("etag") or f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"',
+                stored_at=now,
+                expires_at=now + ttl,
+                vary=vary,
+            )
+            await self._put(self._full_key(base, vary, request), entry)
+            return self._respond(request, entry, "MISS")
+
+        async def _rest():
+            for c in chunks:
+                yield c
+            async for c in iterator:
+                yield c
+
+        resp.body_iterator = _rest()
+        return resp
+
+
+response_cache = ResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES)
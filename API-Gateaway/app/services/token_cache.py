@@ -0,0 +1,72 @@
+# app/services/token_cache.py
+import hashlib
+import time
+from typing import Optional
+
+from cachetools import TLRUCache
+
+from app.core.config import settings
+from app.schemas.auth import IntrospectResponse
+
+
+def _token_key(token: str) -> str:
+    # В памяти держим только хэш — сам токен в кэш не попадает
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _ttu(_key, value: IntrospectResponse, now: float) -> float:
+    """
+    Время жизни записи: активный токен — не дольше TTL и не дольше его exp,
+    неактивный — короткий negative TTL.
+    """
+    if not value.active:
+        return now + settings.INTROSPECT_NEGATIVE_TTL_S
+    ttl = settings.INTROSPECT_CACHE_TTL_S
+    if value.exp is not None:
+        ttl = min(ttl, value.exp - time.time())
+    return now + max(ttl, 0.0)
+
+
+class IntrospectCache:
+    """LRU-кэш ответов introspect с TTL на запись и счётчиками попаданий."""
+
+    def __init__(self, maxsize: int):
+        self._cache = TLRUCache(maxsize=maxsize, ttu=_ttu)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[IntrospectResponse]:
+        data = self._cache.get(_token_key(token))
+        if data is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return data
+
+    def peek(self, token: str) -> Optional[IntrospectResponse]:
+        """Как get, но без учёта в счётчиках."""
+        return self._cache.get(_token_key(token))
+
+    def put(self, token: str, data: IntrospectResponse) -> None:
+        if data.active and data.exp is not None and data.exp <= time.time():
+            return
+        self._cache[_token_key(token)] = data
+
+    def invalidate(self, token: str) -> None:
+        self._cache.pop(_token_key(token), None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": self._cache.currsize,
+            "maxsize": self._cache.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+introspect_cache = IntrospectCache(settings.INTROSPECT_CACHE_SIZE)
@@ -0,0 +1,60 @@
+import json
+import logging
+import random
+import time
+
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+
+log = logging.getLogger("access")
+
+
+class AccessLogMiddleware:
+    """
+    Одна структурированная (JSON) строка на запрос. Тело и заголовки не читаются.
+    Ошибки (5xx) и медленные запросы пишутся всегда, остальные — с долей ACCESS_LOG_SAMPLE_RATE.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def send_with_log(message: Message):
+            nonlocal status, sent
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_log)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if (
+                status >= 500
+                or duration_ms >= settings.ACCESS_LOG_SLOW_MS
+                or random.random() < settings.ACCESS_LOG_SAMPLE_RATE
+            ):
+                headers = Headers(scope=scope)
+                client = scope.get("client")
+                log.info(json.dumps({
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "status": status,
+                    "duration_ms": round(duration_ms, 2),
+                    "bytes": sent,
+                    "request_id": scope.get("state", {}).get("request_id") or headers.get("x-request-id"),
+                    "client": client[0] if client else None,
+                    "user_agent": headers.get("user-agent"),
+                }, ensure_ascii=False))
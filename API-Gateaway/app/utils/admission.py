@@ -0,0 +1,263 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import math
+import re
+import time
+from typing import Dict, List, Optional
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.utils import metrics
+
+log = logging.getLogger(__name__)
+
+HIGH = 0
+NORMAL = 1
+LOW = 2
+_PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+# Те же пути, что прокси отдаёт потоком (см. proxy._streaming)
+_STREAM_PATTERNS = [re.compile(p) for p in settings.PROXY_STREAM_PATHS]
+
+
+class Shed(Exception):
+    """Запрос отброшен контролем допуска."""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ConcurrencyLimiter:
+    """
+    Ограничение одновременных запросов с ограниченной очередью ожидания.
+    Очередь приоритетная: освободившийся слот получает самый приоритетный (затем самый старый)
+    ожидающий. При полной очереди новый запрос вытесняет худшего ожидающего, если он важнее его,
+    иначе отбрасывается сразу.
+    """
+
+    def __init__(self, name: str, limit: int, queue_size: int):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self.shed = 0
+        self._waiters: List[tuple] = []   # heap of (priority, seq, future)
+        self._seq = itertools.count()
+
+    def _drop(self, entry: tuple) -> None:
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+    async def acquire(self, priority: int, timeout: float) -> None:
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        if timeout <= 0:
+            self.shed += 1
+            raise Shed("timeout")
+
+        if len(self._waiters) >= self.queue_size:
+            # wait_for мог уже отменить future ожидающего, который ещё не успел убрать себя
+            # из кучи, — такие не занимают места и не годятся в жертвы вытеснения
+            live = [w for w in self._waiters if not w[2].done()]
+            if len(live) != len(self._waiters):
+                heapq.heapify(live)
+                self._waiters = live
+        if len(self._waiters) >= self.queue_size:
+            worst = max(self._waiters)
+            if worst[0] <= priority:
+                self.shed += 1
+                raise Shed("queue_full")
+            self._drop(worst)
+            if not worst[2].done():
+                self.shed += 1
+                worst[2].set_exception(Shed("evicted"))
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), fut)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            self._drop(entry)
+            self.shed += 1
+            raise Shed("timeout")
+        except asyncio.CancelledError:
+            # Клиент ушёл, пока ждал. Если слот уже был передан — возвращаем его
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self.release()
+            else:
+                self._drop(entry)
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, fut = heapq.heappop(self._waiters)
+            if not fut.done():
+                # Слот переходит ожидающему, in_flight не меняется
+                fut.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "queue_size": self.queue_size,
+            "shed": self.shed,
+        }
+
+
+_LIMITERS: Dict[str, ConcurrencyLimiter] = {}
+
+
+def get_limiter(name: str, limit: int, queue_size: int) -> ConcurrencyLimiter:
+    limiter = _LIMITERS.get(name)
+    if limiter is None:
+        limiter = _LIMITERS[name] = ConcurrencyLimiter(name, limit, queue_size)
+    return limiter
+
+
+def snapshot() -> dict:
+    return {name: l.snapshot() for name, l in _LIMITERS.items()}
+
+
+class AdmissionMiddleware:
+    """
+    Контроль допуска: глобальный и помаршрутный лимит одновременных запросов,
+    ожидание в очереди не дольше queue_timeout, дальше — 503 с Retry-After.
+    Лучше быстро отказать части клиентов, чем отвечать всем по таймауту PROXY_TIMEOUT_S.
+    Слот держится до конца ответа. Исключение — стримы (файлы, Range, text/event-stream):
+    глобальный слот отпускается, как только начат ответ, иначе долгие скачивания и SSE
+    занимают его на всё время передачи и отказы получают все остальные. Слот маршрута
+    держится до конца.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_concurrent: int = 150,
+        queue_size: int = 300,
+        queue_timeout: float = 2.0,
+        route_limits: Optional[Dict[str, int]] = None,
+    ):
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self.global_limiter = get_limiter("global", max_concurrent, queue_size)
+        # Длинные префиксы проверяем первыми
+        self.route_limiters = [
+            (prefix, get_limiter(prefix, limit, queue_size))
+            for prefix, limit in sorted((route_limits or {}).items(), key=lambda kv: len(kv[0]), reverse=True)
+        ]
+
+    def _route_limiter(self, path: str) -> Optional[ConcurrencyLimiter]:
+        for prefix, limiter in self.route_limiters:
+            if path.startswith(prefix):
+                return limiter
+        return None
+
+    @staticmethod
+    def _priority(scope: Scope) -> int:
+        path = scope["path"]
+        method = scope["method"]
+        if path.startswith(tuple(settings.ADMISSION_HIGH_PRIORITY)):
+            return HIGH
+        if method in ("GET", "HEAD") and path.startswith(tuple(settings.ADMISSION_HIGH_PRIORITY_READS)):
+            return HIGH
+        if path.startswith(tuple(settings.ADMISSION_LOW_PRIORITY)):
+            return LOW
+        # Крупные и chunked тела — это загрузки
+        headers = Headers(scope=scope)
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            return LOW
+        length = headers.get("content-length")
+        if length and length.isdigit() and int(length) > settings.PROXY_REPLAY_MAX_BYTES:
+            return LOW
+        return NORMAL
+
+    @staticmethod
+    def _streaming(scope: Scope, start: Message) -> bool:
+        request_headers = Headers(scope=scope)
+        if "range" in request_headers or "text/event-stream" in request_headers.get("accept", ""):
+            return True
+        if Headers(raw=start["headers"]).get("content-type", "").startswith("text/event-stream"):
+            return True
+        return any(p.match(scope["path"]) for p in _STREAM_PATTERNS)
+
+    async def admit(self, scope: Scope) -> List[ConcurrencyLimiter]:
+        """
+        Занять слот маршрута и глобальный. Возвращает занятые лимитеры — их нужно отпустить
+        через release(); при отказе занятое уже отпущено и поднимается Shed.
+        """
+        priority = self._priority(scope)
+        deadline = time.monotonic() + self.queue_timeout
+        acquired: List[ConcurrencyLimiter] = []
+        # Сначала маршрут, потом общий лимит — запрос в узком маршруте не занимает глобальный слот, пока ждёт
+        for limiter in (self._route_limiter(scope["path"]), self.global_limiter):
+            if limiter is None:
+                continue
+            try:
+                await limiter.acquire(priority, deadline - time.monotonic())
+            except Shed as e:
+                metrics.ADMISSION_SHED.labels(limiter.name, _PRIORITY_NAMES[priority], e.reason).inc()
+                log.debug("Shed %s %s: %s (%s)", scope["method"], scope["path"], e.reason, limiter.name)
+                self.release(acquired)
+                raise
+            except BaseException:
+                self.release(acquired)
+                raise
+            acquired.append(limiter)
+        return acquired
+
+    @staticmethod
+    def release(acquired: List[ConcurrencyLimiter]) -> None:
+        for limiter in acquired:
+            limiter.release()
+
+    @staticmethod
+    def overloaded() -> JSONResponse:
+        return JSONResponse(
+            {"detail": "Server overloaded"},
+            status_code=503,
+            headers={
+                "Retry-After": str(max(1, math.ceil(settings.ADMISSION_RETRY_AFTER_S))),
+                "Cache-Control": "no-store",
+            },
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"].startswith(tuple(settings.ADMISSION_EXEMPT_PATHS)):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            acquired = await self.admit(scope)
+        except Shed:
+            await self.overloaded()(scope, receive, send)
+            return
+        # Подзапросы /api/batch занимают слоты по одному через request.state.admission
+        scope.setdefault("state", {})["admission"] = self
+
+        async def send_admitted(message: Message):
+            if (
+                message["type"] == "http.response.start"
+                and self.global_limiter in acquired
+                and self._streaming(scope, message)
+            ):
+                acquired.remove(self.global_limiter)
+                self.global_limiter.release()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_admitted)
+        finally:
+            self.release(acquired)
@@ -0,0 +1,185 @@
+import zlib
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # без brotli остаётся только gzip
+    brotli = None
+
+
+class GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int):
+        # wbits=31 — zlib пишет gzip-заголовок и трейлер сам
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        # Z_SYNC_FLUSH: всё сжатое до этого места клиент может распаковать сразу
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush()
+
+
+class BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int):
+        self._c = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+def _accepted(accept_encoding: str) -> dict:
+    """Accept-Encoding -> {кодировка: q}."""
+    result = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        result[token] = q
+    return result
+
+
+class CompressionMiddleware:
+    """
+    Сжатие ответов по Accept-Encoding (br, затем gzip), чанк за чанком — тело не буферизуется.
+    Пропускает: уже сжатые ответы, типы вне allowlist (PDF, картинки), text/event-stream,
+    Range/206, Cache-Control: no-transform и ответы меньше min_size.
+    Ответ без Content-Length сжимается с первого чанка, и каждый чанк сбрасывается
+    энкодером сразу — стриминг не задерживается.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        min_size: int = 1024,
+        content_types: Optional[List[str]] = None,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.content_types = tuple(t.lower() for t in (content_types or []))
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _choose(self, scope: Scope):
+        headers = Headers(scope=scope)
+        if "range" in headers:
+            return None
+        accepted = _accepted(headers.get("accept-encoding", ""))
+        if brotli is not None and accepted.get("br", 0) > 0:
+            return lambda: BrotliEncoder(self.brotli_quality)
+        if accepted.get("gzip", 0) > 0:
+            return lambda: GzipEncoder(self.gzip_level)
+        return None
+
+    def _compressible(self, message: Message) -> bool:
+        if message["status"] < 200 or message["status"] in (204, 206, 304):
+            return False
+        headers = Headers(raw=message["headers"])
+        if "content-encoding" in headers:
+            return False
+        if "no-transform" in headers.get("cache-control", "").lower():
+            return False
+        ctype = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+        # SSE: события должны уходить клиенту по одному, а не копиться в энкодере
+        if ctype == "text/event-stream" or not ctype.startswith(self.content_types):
+            return False
+        length = headers.get("content-length")
+        return length is None or int(length) >= self.min_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        make_encoder = self._choose(scope)
+        if make_encoder is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder = None
+        passthrough = False
+        streaming = False   # нет Content-Length — сбрасываем энкодер после каждого чанка
+
+        async def start_compressed(first: bytes, more: bool):
+            nonlocal encoder
+            encoder = make_encoder()
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = encoder.name
+            headers.add_vary_header("Accept-Encoding")
+            if "content-length" in headers:
+                del headers["content-length"]
+            etag = headers.get("etag")
+            if etag and not etag.startswith("W/"):
+                # Сжатое представление уже не побайтно равно исходному
+                headers["ETag"] = "W/" + etag
+            await send(start)
+            body = encoder.compress(first)
+            if not more:
+                body += encoder.finish()
+            elif streaming:
+                body += encoder.flush()
+            await send({"type": "http.response.body", "body": body, "more_body": more})
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough, streaming
+            if message["type"] == "http.response.start":
+                start = message
+                if not self._compressible(message):
+                    passthrough = True
+                    await send(message)
+                else:
+                    streaming = "content-length" not in Headers(raw=message["headers"])
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+
+            if encoder is not None:
+                out = encoder.compress(body)
+                if not more:
+                    out += encoder.finish()
+                elif streaming:
+                    out += encoder.flush()
+                if out or not more:
+                    await send({"type": "http.response.body", "body": out, "more_body": more})
+                return
+
+            # Тело без Content-Length пришло целиком и оказалось маленьким — сжимать незачем.
+            # Иначе начинаем сжимать сразу: ждать min_size байт — значит держать стрим
+            if not more and len(body) < self.min_size:
+                passthrough = True
+                await send(start)
+                await send(message)
+                return
+            await start_compressed(body, more)
+
+        await self.app(scope, receive, send_compressed)
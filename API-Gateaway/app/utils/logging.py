@@ -1,13 +1,63 @@
 import logging
+import queue
 import sys
+import zlib
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
 from app.core.config import settings
 
+_listener: Optional[QueueListener] = None
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """При переполненной очереди запись теряется, но event loop не ждёт."""
+
+    dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
 
 def setup_logging():
+    """
+    Логи пишутся в stdout из отдельного потока (QueueListener):
+    в обработчиках запросов — только put_nowait в очередь.
+    """
+    global _listener
+    root = logging.getLogger()
+    root.setLevel(settings.LOG_LEVEL.upper())
+    if _listener is not None:
+        return
+
     handler = logging.StreamHandler(sys.stdout)
     fmt = "[%(asctime)s] [%(levelname)s] %(name)s: %(message)s"
     handler.setFormatter(logging.Formatter(fmt))
-    root = logging.getLogger()
-    root.setLevel(settings.LOG_LEVEL.upper())
-    if not any(isinstance(h, logging.StreamHandler) for h in root.handlers):
-        root.addHandler(handler)
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    _listener = QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(_DroppingQueueHandler(log_queue))
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def is_sampled(request_id: Optional[str]) -> bool:
+    """
+    Подробные (DEBUG) логи пишутся только для доли запросов.
+    Решение детерминировано по request id: все строки одного запроса либо есть, либо нет.
+    """
+    rate = settings.LOG_VERBOSE_SAMPLE_RATE
+    if rate >= 1.0:
+        return True
+    if rate <= 0.0 or not request_id:
+        return False
+    return (zlib.crc32(request_id.encode("utf-8")) % 10000) < rate * 10000
@@ -0,0 +1,91 @@
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Бакеты подобраны под гейтвей: от ~1 мс до длинных загрузок
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUESTS = Counter(
+    "gateway_requests_total", "Запросы к гейтвею", ["route", "method", "status"]
+)
+REQUEST_DURATION = Histogram(
+    "gateway_request_duration_seconds", "Время ответа гейтвея до отправки заголовков",
+    ["route", "method"], buckets=_BUCKETS,
+)
+IN_FLIGHT = Gauge(
+    "gateway_requests_in_flight", "Запросы в обработке"
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "gateway_upstream_in_flight", "Запросы в апстрим в процессе", ["upstream"]
+)
+UPSTREAM_TTFB = Histogram(
+    "gateway_upstream_ttfb_seconds", "Время до заголовков ответа апстрима",
+    ["upstream"], buckets=_BUCKETS,
+)
+UPSTREAM_DURATION = Histogram(
+    "gateway_upstream_duration_seconds", "Полное время запроса в апстрим, включая ретраи",
+    ["upstream", "outcome"], buckets=_BUCKETS,
+)
+UPSTREAM_RETRIES = Counter(
+    "gateway_upstream_retries_total", "Повторы запросов в апстрим", ["upstream"]
+)
+UPSTREAM_HEDGES = Counter(
+    "gateway_upstream_hedges_total", "Хеджированные запросы в апстрим", ["route", "result"]
+)
+RATE_LIMITED = Counter(
+    "gateway_rate_limit_rejections_total", "Отказы rate limiter (429)", ["scope"]
+)
+ADMISSION_SHED = Counter(
+    "gateway_admission_shed_total", "Запросы, отброшенные контролем допуска (503)",
+    ["limiter", "priority", "reason"],
+)
+INTROSPECT_DURATION = Histogram(
+    "gateway_introspect_duration_seconds", "Время introspect в AuthService",
+    ["outcome"], buckets=_BUCKETS,
+)
+INTROSPECT_CACHE = Counter(
+    "gateway_introspect_cache_total", "Обращения к кэшу introspect", ["result"]
+)
+
+_UNMATCHED = "<unmatched>"
+
+
+def render() -> tuple[bytes, str]:
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class MetricsMiddleware:
+    """
+    Счётчики и гистограммы по шаблону маршрута (/api/catalog/{path:path}), а не по сырому пути —
+    иначе кардинальность меток растёт с каждым id.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_metrics(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                route = scope.get("route")
+                REQUEST_DURATION.labels(
+                    getattr(route, "path", _UNMATCHED), scope["method"]
+                ).observe(time.perf_counter() - start)
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            IN_FLIGHT.dec()
+            route = scope.get("route")
+            REQUESTS.labels(getattr(route, "path", _UNMATCHED), scope["method"], str(status)).inc()
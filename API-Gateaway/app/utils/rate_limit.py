@@ -1,33 +1,175 @@
+import hashlib
+import logging
+import math
 import time
-from collections import defaultdict, deque
-from starlette.middleware.base import BaseHTTPMiddleware
+from typing import Dict, Optional, Tuple
+
+from cachetools import LRUCache
 from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.redis import get_redis
+from app.services.jwt_verifier import verify_local
+from app.services.token_cache import introspect_cache
+from app.utils import metrics
+
+log = logging.getLogger(__name__)
+
+# GCRA: на ключ хранится одно число — TAT (theoretical arrival time).
+# Время берём у Redis, чтобы все воркеры/инстансы гейтвея жили по одним часам.
+_GCRA_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then tat = now end
+local new_tat = tat + interval * cost
+local allow_at = new_tat - burst * interval
+if now < allow_at then
+  return {0, tostring(allow_at - now)}
+end
+redis.call('SET', KEYS[1], tostring(new_tat), 'PX', math.ceil((new_tat - now) * 1000))
+return {1, '0'}
+"""
+
+Quota = Tuple[float, int]  # (rps, burst)
+
+
+class LocalGCRA:
+    """GCRA в памяти процесса: ограниченный LRU, O(1) состояния на ключ."""
+
+    def __init__(self, maxsize: int):
+        self.tats = LRUCache(maxsize=maxsize)
 
+    def hit(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        interval = 1.0 / rate
+        tat = max(self.tats.get(key, now), now)
+        new_tat = tat + interval * cost
+        allow_at = new_tat - burst * interval
+        if now < allow_at:
+            return False, allow_at - now
+        self.tats[key] = new_tat
+        return True, 0.0
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, rate: float = 5.0, burst: int = 10):
-        super().__init__(app)
+
+class RedisGCRA:
+    """GCRA в Redis: атомарный Lua-скрипт, общий лимит для всех воркеров."""
+
+    def __init__(self, redis):
+        self.script = redis.register_script(_GCRA_LUA)
+
+    async def hit(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        allowed, retry_after = await self.script(keys=[key], args=[1.0 / rate, burst, cost])
+        return bool(int(allowed)), float(retry_after)
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate: float = 5.0,
+        burst: int = 10,
+        route_quotas: Optional[Dict[str, Quota]] = None,
+        role_quotas: Optional[Dict[str, Quota]] = None,
+    ):
+        self.app = app
         self.rate = rate
         self.burst = burst
-        self.buckets = defaultdict(deque)  # key->deque[timestamps]
+        # Длинные префиксы проверяем первыми
+        self.route_quotas = sorted((route_quotas or {}).items(), key=lambda kv: len(kv[0]), reverse=True)
+        self.role_quotas = role_quotas or {}
+        self.local = LocalGCRA(settings.RATE_LIMIT_MAX_KEYS)
+        self._redis_limiter: Optional[RedisGCRA] = None
+        self._redis_down_until = 0.0
 
     def _key(self, request: Request) -> str:
         token = request.headers.get("authorization", "")
+        if token:
+            # Сырые токены не держим ни в памяти, ни в Redis
+            return "t:" + hashlib.sha256(token.encode("utf-8")).hexdigest()[:32]
         ip = request.client.host if request.client else "unknown"
-        return token or ip
+        return "ip:" + ip
+
+    def _roles(self, request: Request) -> list:
+        """
+        Роли нужны только для выбора квоты. Берём их лишь из проверенного источника:
+        локальная проверка подписи или уже закэшированный ответ introspect.
+        """
+        if not self.role_quotas:
+            return []
+        auth = request.headers.get("authorization", "")
+        if not auth.lower().startswith("bearer "):
+            return []
+        token = auth.split(" ", 1)[1].strip()
+        data = verify_local(token) if settings.AUTH_MODE != "introspect" else None
+        if data is None:
+            data = introspect_cache.peek(token)
+        return data.roles if data is not None and data.active else []
+
+    def _quota(self, request: Request) -> Tuple[str, float, int]:
+        path = request.url.path
+        for prefix, (rate, burst) in self.route_quotas:
+            if path.startswith(prefix):
+                return prefix, rate, burst
+        best = None
+        for role in self._roles(request):
+            quota = self.role_quotas.get(role)
+            if quota and (best is None or quota[0] > best[1][0]):
+                best = (role, quota)
+        if best:
+            return "role:" + best[0], best[1][0], best[1][1]
+        return "default", self.rate, self.burst
+
+    async def _hit(self, key: str, rate: float, burst: int, cost: float = 1.0) -> Tuple[bool, float]:
+        now = time.monotonic()
+        redis = get_redis()
+        if redis is not None and now >= self._redis_down_until:
+            try:
+                if self._redis_limiter is None:
+                    self._redis_limiter = RedisGCRA(redis)
+                return await self._redis_limiter.hit(key, rate, burst, cost)
+            except Exception as e:
+                # Redis недоступен — временно считаем локально, не роняя запросы
+                log.warning("Rate limit backend unavailable (%s), falling back to local", e)
+                self._redis_down_until = now + settings.RATE_LIMIT_REDIS_RETRY_S
+        return self.local.hit(key, rate, burst, cost)
 
-    async def dispatch(self, request: Request, call_next):
-        key = self._key(request)
-        now = time.time()
-        window = 1.0  # сек
+    async def check(
+        self, request: Request, cost: float = 1.0, quota: Optional[Tuple[str, float, int]] = None
+    ) -> Optional[float]:
+        """
+        Списать с квоты cost запросов. quota — (имя, rps, burst) вместо квоты по маршруту и роли.
+        None — пропускаем, иначе через сколько секунд можно повторить.
+        """
+        scope_name, rate, burst = quota or self._quota(request)
+        if rate <= 0:
+            return None
+        allowed, retry_after = await self._hit(f"rl:{scope_name}:{self._key(request)}", rate, burst, cost)
+        if allowed:
+            return None
+        metrics.RATE_LIMITED.labels(scope_name).inc()
+        return retry_after
 
-        q = self.buckets[key]
-        while q and now - q[0] > window:
-            q.popleft()
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
 
-        if len(q) >= self.burst:
-            return JSONResponse({"detail": "Too Many Requests"}, status_code=429)
+        # /api/batch списывает подзапросы со своей квоты через request.state.rate_limiter
+        scope.setdefault("state", {})["rate_limiter"] = self
+        retry_after = await self.check(Request(scope))
+        if retry_after is not None:
+            response = JSONResponse(
+                {"detail": "Too Many Requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+            )
+            await response(scope, receive, send)
+            return
 
-        q.append(now)
-        return await call_next(request)
+        await self.app(scope, receive, send)
@@ -1,18 +1,29 @@
 import uuid
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
-from starlette.requests import Request
-from starlette.responses import Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 
-class RequestIDMiddleware(BaseHTTPMiddleware):
+class RequestIDMiddleware:
+    """
+    Чистый ASGI: без BaseHTTPMiddleware (лишняя задача и обёртка стрима на каждый запрос).
+    """
+
     def __init__(self, app: ASGIApp, header_name: str = "X-Request-ID"):
-        super().__init__(app)
+        self.app = app
         self.header_name = header_name
 
-    async def dispatch(self, request: Request, call_next):
-        req_id = request.headers.get(self.header_name) or str(uuid.uuid4())
-        request.state.request_id = req_id
-        response: Response = await call_next(request)
-        response.headers[self.header_name] = req_id
-        return response
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        req_id = Headers(scope=scope).get(self.header_name) or str(uuid.uuid4())
+        # request.state хранится в scope["state"]
+        scope.setdefault("state", {})["request_id"] = req_id
+
+        async def send_with_id(message: Message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self.header_name] = req_id
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
@@ -0,0 +1,105 @@
+"""
+Микробенчмарк проверки токена: локальная проверка JWT против introspect в AuthService.
+
+Запуск из каталога API-Gateaway:
+    python -m bench.auth_modes [--n 2000]
+
+Поднимает заглушку /auth/introspect на 127.0.0.1 (uvicorn в отдельном потоке),
+кэш introspect на время замера выключен — сравнивается стоимость одного запроса.
+"""
+import argparse
+import asyncio
+import socket
+import statistics
+import threading
+import time
+
+import jwt
+import uvicorn
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.services import auth_client
+from app.services.jwt_verifier import verify_local
+
+SECRET = "bench-secret"
+
+
+def _make_token() -> str:
+    now = int(time.time())
+    payload = {"sub": "1", "roles": ["student"], "typ": "access", "iat": now, "exp": now + 3600}
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+def _stub_auth_app() -> FastAPI:
+    stub = FastAPI()
+
+    @stub.post("/auth/introspect")
+    def introspect(body: dict):
+        data = jwt.decode(body["token"], SECRET, algorithms=["HS256"])
+        return {"active": True, "user_id": int(data["sub"]), "roles": data["roles"], "exp": data["exp"]}
+
+    return stub
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_stub(port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(_stub_auth_app(), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples.sort()
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{name:<12} mean={statistics.mean(samples) * 1e6:9.1f}us  "
+          f"p50={statistics.median(samples) * 1e6:9.1f}us  p99={p99 * 1e6:9.1f}us")
+
+
+async def _bench(n: int) -> None:
+    token = _make_token()
+
+    local = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        assert verify_local(token).active
+        local.append(time.perf_counter() - t0)
+
+    remote = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        assert (await auth_client.introspect(token)).active
+        remote.append(time.perf_counter() - t0)
+
+    _report("local", local)
+    _report("introspect", remote)
+    print(f"saving per request: {(statistics.mean(remote) - statistics.mean(local)) * 1e3:.3f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=2000)
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = _start_stub(port)
+
+    settings.AUTH_SERVICE_URL = f"http://127.0.0.1:{port}"
+    settings.JWT_SECRET_KEY = SECRET
+    settings.JWT_ALG = "HS256"
+    settings.INTROSPECT_CACHE_ENABLED = False
+    try:
+        asyncio.run(_bench(args.n))
+    finally:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Сжатие ответов гейтвея: сколько байт экономим и сколько CPU тратим.
+
+Запуск из каталога API-Gateaway:
+    python -m bench.compression [--books 2000] [--chunk 65536]
+
+Тело — JSON в форме ответа /api/catalog/books; сжимается теми же энкодерами,
+что и в CompressionMiddleware, кусками по --chunk байт.
+"""
+import argparse
+import json
+import time
+
+from app.utils.compression import BrotliEncoder, GzipEncoder, brotli
+
+
+def _payload(books: int) -> bytes:
+    items = [
+        {
+            "id": i,
+            "title": f"Основы программирования, том {i % 7 + 1}",
+            "isbn": f"978-601-{i:06d}",
+            "year": str(1990 + i % 35),
+            "lang": "ru" if i % 3 else "kk",
+            "description": "Учебное пособие для студентов технических специальностей. " * 3,
+            "authors": [{"id": i % 50, "name": f"Автор {i % 50}"}],
+            "subjects": [{"id": i % 12, "name": f"Дисциплина {i % 12}"}],
+            "download_url": f"/files/{i:032x}.pdf",
+            "formats": ["pdf"],
+        }
+        for i in range(books)
+    ]
+    return json.dumps({"items": items, "page": {"limit": books, "offset": 0, "total": books}},
+                      ensure_ascii=False).encode("utf-8")
+
+
+def _run(make_encoder, body: bytes, chunk: int, rounds: int = 5) -> tuple[int, float]:
+    best = float("inf")
+    size = 0
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        enc = make_encoder()
+        size = 0
+        for i in range(0, len(body), chunk):
+            size += len(enc.compress(body[i:i + chunk]))
+        size += len(enc.finish())
+        best = min(best, time.perf_counter() - t0)
+    return size, best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--chunk", type=int, default=64 * 1024)
+    args = parser.parse_args()
+
+    body = _payload(args.books)
+    print(f"payload: {len(body) / 1024:.1f} KiB, chunk {args.chunk} B")
+
+    variants = [(f"gzip-{lvl}", lambda lvl=lvl: GzipEncoder(lvl)) for lvl in (1, 6, 9)]
+    if brotli is not None:
+        variants += [(f"br-{q}", lambda q=q: BrotliEncoder(q)) for q in (1, 4, 6, 11)]
+
+    for name, make in variants:
+        size, elapsed = _run(make, body, args.chunk)
+        saved = 100.0 * (1 - size / len(body))
+        print(f"{name:<8} out={size / 1024:8.1f} KiB  saved={saved:5.1f}%  "
+              f"cpu={elapsed * 1e3:7.2f} ms  throughput={len(body) / elapsed / 2 ** 20:7.1f} MiB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Нагрузочный прогон гейтвея целиком: настоящий app.main со всеми middleware,
+апстримы — заглушки на 127.0.0.1 (uvicorn в отдельном потоке).
+
+Запуск из каталога API-Gateaway:
+    python -m bench.gateway [--requests 2000] [--concurrency 50] [--payload 16384]
+                            [--latency-ms 0] [--upload-size 1048576] [--scenarios public,secure,upload]
+                            [--auth-mode introspect] [--tracemalloc]
+                            [--out bench/results/run.json] [--compare bench/results/baseline.json]
+
+Сценарии:
+    public  — GET /api/catalog/books (без авторизации, кэш ответов выключен)
+    secure  — GET /api/reviews/ с Bearer-токеном (auth_required → introspect или локальный JWT)
+    upload  — POST /api/files/upload с телом --upload-size (стриминг тела в апстрим)
+
+На каждый сценарий: rps, p50/p99, число ошибок, пик RSS процесса и, с --tracemalloc,
+пик Python-кучи за сценарий (tracemalloc заметно замедляет прогон — rps тогда несравнимы).
+Заглушки живут в том же процессе, поэтому RSS включает и их.
+Результат пишется в JSON; --compare печатает разницу с прошлым прогоном.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import httpx
+import jwt
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import Response
+
+SECRET = "bench-secret"
+SCENARIOS = {
+    "public": ("GET", "/api/catalog/books", False),
+    "secure": ("GET", "/api/reviews/", True),
+    "upload": ("POST", "/api/files/upload", True),
+}
+
+
+def _make_token() -> str:
+    now = int(time.time())
+    payload = {"sub": "1", "roles": ["student"], "typ": "access", "iat": now, "exp": now + 3600}
+    return jwt.encode(payload, SECRET, algorithm="HS256")
+
+
+def _stub_app(payload: int, latency_s: float) -> FastAPI:
+    """Один процесс изображает все сервисы: гейтвей различает их только по URL."""
+    stub = FastAPI()
+    body = json.dumps({"items": "x" * max(0, payload - 13)}).encode("utf-8")
+
+    async def _reply() -> Response:
+        if latency_s:
+            await asyncio.sleep(latency_s)
+        return Response(body, media_type="application/json")
+
+    @stub.get("/catalog/books")
+    async def books():
+        return await _reply()
+
+    @stub.get("/reviews")
+    async def reviews():
+        return await _reply()
+
+    # Этот маршрут гейтвей проксирует без path_suffix — с полным путём
+    @stub.post("/api/files/upload")
+    async def upload(request: Request):
+        received = 0
+        async for chunk in request.stream():
+            received += len(chunk)
+        if latency_s:
+            await asyncio.sleep(latency_s)
+        return {"received": received}
+
+    @stub.post("/auth/introspect")
+    async def introspect(data: dict):
+        claims = jwt.decode(data["token"], SECRET, algorithms=["HS256"])
+        return {"active": True, "user_id": claims["sub"], "roles": claims["roles"], "exp": claims["exp"]}
+
+    return stub
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_stub(app: FastAPI, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+def _configure(port: int, auth_mode: str) -> None:
+    """Настройки гейтвея читаются при импорте app.main — выставляем их до него."""
+    url = f"http://127.0.0.1:{port}"
+    for name in ("AUTH", "CATALOG", "FILE", "SEARCH", "PROFILE", "NOTIFY", "REVIEW", "FAVOURITES"):
+        os.environ[f"{name}_SERVICE_URL"] = url
+    os.environ.update(
+        AUTH_MODE=auth_mode,
+        JWT_SECRET_KEY=SECRET,
+        JWT_ALG="HS256",
+        RATE_LIMIT_RPS="0",               # лимитер пропускает всё, но остаётся в стеке
+        RESPONSE_CACHE_ENABLED="false",   # меряем прокси, а не попадания в кэш
+        LOG_LEVEL="WARNING",
+    )
+
+
+def _rss_mb() -> float:
+    # ru_maxrss: килобайты на Linux, байты на macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def _run(client: httpx.AsyncClient, scenario: str, total: int, concurrency: int, upload: bytes) -> dict:
+    method, path, secure = SCENARIOS[scenario]
+    headers = {"Authorization": f"Bearer {_make_token()}"} if secure else {}
+    content = upload if method == "POST" else None
+    latencies, errors = [], 0
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one():
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            resp = await client.request(method, path, headers=headers, content=content)
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1e3, 3),
+        "p99_ms": round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1e3, 3),
+    }
+
+
+async def _bench(args) -> dict:
+    from app.main import app
+
+    upload = b"u" * args.upload_size
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway", timeout=60) as client:
+        for scenario in args.scenarios:
+            await _run(client, scenario, min(args.requests, 200), args.concurrency, upload)  # прогрев
+            if args.tracemalloc:
+                tracemalloc.start()
+            result = await _run(client, scenario, args.requests, args.concurrency, upload)
+            if args.tracemalloc:
+                result["py_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 2)
+                tracemalloc.stop()
+            result["rss_peak_mb"] = _rss_mb()
+            results[scenario] = result
+            print(
+                f"{scenario:<8} rps={result['rps']:9.1f}  p50={result['p50_ms']:8.2f}ms  "
+                f"p99={result['p99_ms']:8.2f}ms  errors={result['errors']}  rss={result['rss_peak_mb']}MB"
+            )
+    return results
+
+
+def _compare(current: dict, path: str) -> None:
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    print(f"\nvs {path}:")
+    for scenario, cur in current.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        deltas = []
+        for key in ("rps", "p50_ms", "p99_ms", "rss_peak_mb"):
+            if base.get(key):
+                deltas.append(f"{key} {(cur[key] - base[key]) / base[key] * 100:+6.1f}%")
+        print(f"{scenario:<8} " + "  ".join(deltas))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--payload", type=int, default=16 * 1024, help="размер ответа заглушки, байт")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="задержка ответа заглушки")
+    parser.add_argument("--upload-size", type=int, default=1024 * 1024)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--auth-mode", choices=["local", "introspect", "hybrid"], default="introspect")
+    parser.add_argument("--tracemalloc", action="store_true")
+    parser.add_argument("--out", default=None, help="JSON с результатами (по умолчанию bench/results/gateway-<время>.json)")
+    parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+    args = parser.parse_args()
+    args.scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    port = _free_port()
+    server = _start_stub(_stub_app(args.payload, args.latency_ms / 1000), port)
+    _configure(port, args.auth_mode)
+    try:
+        results = asyncio.run(_bench(args))
+    finally:
+        server.should_exit = True
+
+    started = datetime.now(timezone.utc)
+    report = {
+        "meta": {
+            "timestamp": started.isoformat(timespec="seconds"),
+            "git_rev": _git_rev(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join("bench", "results", f"gateway-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nwritten {out}")
+
+    if args.compare:
+        _compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
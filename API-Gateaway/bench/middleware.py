@@ -0,0 +1,129 @@
+"""
+Сравнение стека middleware: BaseHTTPMiddleware (как было) против чистого ASGI.
+
+Запуск из каталога API-Gateaway:
+    python -m bench.middleware [--requests 3000] [--concurrency 50] [--payload 262144]
+
+Оба варианта гоняют проксируемый стриминговый ответ (/api/catalog/books) через
+настоящий router гейтвея; апстрим подменяется httpx.MockTransport.
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+import uuid
+from collections import defaultdict, deque
+
+import httpx
+from fastapi import FastAPI
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse
+
+from app.api.routes import router as api_router
+from app.services import proxy
+from app.utils.rate_limit import RateLimitMiddleware
+from app.utils.request_id import RequestIDMiddleware
+
+CHUNK = 16 * 1024
+
+
+class LegacyRequestIDMiddleware(BaseHTTPMiddleware):
+    async def dispatch(self, request, call_next):
+        req_id = request.headers.get("X-Request-ID") or str(uuid.uuid4())
+        request.state.request_id = req_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = req_id
+        return response
+
+
+class LegacyRateLimitMiddleware(BaseHTTPMiddleware):
+    def __init__(self, app, burst: int):
+        super().__init__(app)
+        self.burst = burst
+        self.buckets = defaultdict(deque)
+
+    async def dispatch(self, request, call_next):
+        key = request.headers.get("authorization", "") or (request.client.host if request.client else "unknown")
+        now = time.time()
+        q = self.buckets[key]
+        while q and now - q[0] > 1.0:
+            q.popleft()
+        if len(q) >= self.burst:
+            return JSONResponse({"detail": "Too Many Requests"}, status_code=429)
+        q.append(now)
+        return await call_next(request)
+
+
+def _build_app(legacy: bool) -> FastAPI:
+    app = FastAPI(redirect_slashes=False)
+    if legacy:
+        app.add_middleware(LegacyRequestIDMiddleware)
+        app.add_middleware(LegacyRateLimitMiddleware, burst=10 ** 9)
+    else:
+        app.add_middleware(RequestIDMiddleware)
+        # Лимит, который никогда не срабатывает: меряем только накладные расходы
+        app.add_middleware(RateLimitMiddleware, rate=10 ** 9, burst=10 ** 9)
+    app.include_router(api_router, prefix="/api")
+    return app
+
+
+def _stub_upstream(payload: int) -> httpx.AsyncClient:
+    async def body():
+        sent = 0
+        while sent < payload:
+            n = min(CHUNK, payload - sent)
+            sent += n
+            yield b"x" * n
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "application/json"}, content=body())
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def _run(app: FastAPI, total: int, concurrency: int) -> dict:
+    latencies = []
+    sem = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+        async def one():
+            async with sem:
+                t0 = time.perf_counter()
+                resp = await client.get("/api/catalog/books")
+                assert resp.status_code == 200, resp.status_code
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "rps": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1e3,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1e3,
+    }
+
+
+async def _bench(total: int, concurrency: int, payload: int) -> None:
+    proxy._CLIENT = _stub_upstream(payload)
+    for name, legacy in (("BaseHTTPMiddleware", True), ("pure ASGI", False)):
+        app = _build_app(legacy)
+        await _run(app, min(total, 200), concurrency)  # прогрев
+        r = await _run(app, total, concurrency)
+        print(f"{name:<20} rps={r['rps']:8.1f}  p50={r['p50_ms']:7.2f}ms  p99={r['p99_ms']:7.2f}ms")
+
+
+def main() -> None:
+    logging.getLogger("app").setLevel(logging.ERROR)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--payload", type=int, default=256 * 1024)
+    args = parser.parse_args()
+    asyncio.run(_bench(args.requests, args.concurrency, args.payload))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,112 @@
+import hmac
+from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
-from app.core.db import SessionLocal
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.db import AsyncReadSessionLocal, AsyncSessionLocal
 from app.models.user import User
+from app.core.config import settings
+from app.services import activity, profile_cache
 from app.schemas.auth import (RegisterRequest, LoginRequest, TokenPair,
-                              IntrospectRequest, IntrospectResponse)
-from app.utils.security import hash_password, verify_password
-from app.utils.tokens import create_access, create_refresh, decode
+                              IntrospectRequest, IntrospectResponse,
+                              IntrospectBatchRequest, IntrospectBatchResponse,
+                              UsersBatchRequest, UsersBatchResponse, ActivityReport)
+from app.utils import keys, security
+from app.utils.security import HasherBusy, hash_password_async, verify_and_update_async
+from app.utils.tokens import create_access, create_refresh, decode, decode_many
 
 router = APIRouter(prefix="/auth", tags=["auth"])
+# Стандартный путь JWKS; тот же ответ есть под /auth/ — он доступен через гейтвей (/api/auth/...)
+jwks_router = APIRouter(tags=["jwks"])
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_read_db():
+    async with AsyncReadSessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
+def _busy() -> HTTPException:
+    return HTTPException(
+        503, "Too many concurrent sign-ins, retry shortly",
+        headers={"Retry-After": str(settings.HASH_RETRY_AFTER_S)},
+    )
+
+
+def _by_email(email: str):
+    return select(User).where(User.email == email)
+
+
+# bcrypt уходит в отдельный пул (utils.security), запросы к БД — через asyncpg,
+# так что ни то ни другое не занимает общий threadpool
 @router.post("/register", status_code=201)
-def register(req: RegisterRequest, db: Session = Depends(get_db)):
+async def register(req: RegisterRequest, db: AsyncSession = Depends(get_db)):
     # временно отключено
     # raise HTTPException(403, "Регистрация пока не разрешена")
 
-    if db.query(User).filter_by(email=req.email).first():
-        raise HTTPException(409, "Email already exists")
-    u = User(email=req.email, hashed_password=hash_password(req.password))
-    db.add(u); db.commit(); db.refresh(u)
+    try:
+        with security.admit():
+            if await db.scalar(_by_email(req.email)):
+                raise HTTPException(409, "Email already exists")
+            # Соединение не держим, пока считается bcrypt: иначе шторм регистраций выберет весь пул
+            await db.commit()
+            u = User(email=req.email, hashed_password=await hash_password_async(req.password))
+            db.add(u)
+            await db.commit()
+            await db.refresh(u)
+    except HasherBusy:
+        raise _busy()
     return {"id": u.id, "email": u.email}
 
 
 @router.post("/login", response_model=TokenPair)
-def login(req: LoginRequest, db: Session = Depends(get_db)):
-    u = db.query(User).filter_by(email=req.email).first()
-    if not u or not verify_password(req.password, u.hashed_password):
-        raise HTTPException(401, "Invalid credentials")
+async def login(req: LoginRequest, db: AsyncSession = Depends(get_read_db)):
+    try:
+        with security.admit():
+            u = await db.scalar(_by_email(req.email))
+            if not u:
+                raise HTTPException(401, "Invalid credentials")
+            await db.commit()   # вернуть соединение в пул на время bcrypt; u остаётся загруженным
+            ok, new_hash = await verify_and_update_async(req.password, u.hashed_password)
+            if not ok:
+                raise HTTPException(401, "Invalid credentials")
+            if new_hash:
+                # Хэш со старой стоимостью — пересчитываем с текущей BCRYPT_ROUNDS, пока пароль известен.
+                # Запись — в обычной транзакционной сессии, а не в AUTOCOMMIT-сессии чтения;
+                # условие на старый хэш не затирает пароль, сменённый за время bcrypt
+                async with AsyncSessionLocal() as wdb:
+                    await wdb.execute(
+                        update(User)
+                        .where(User.id == u.id, User.hashed_password == u.hashed_password)
+                        .values(hashed_password=new_hash)
+                    )
+                    await wdb.commit()
+    except HasherBusy:
+        raise _busy()
+    activity.touch(u.id, login=True)
     access, exp = create_access(u.id, u.role or "")
     refresh, _ = create_refresh(u.id)
     return TokenPair(access_token=access, refresh_token=refresh, expires_in=int(exp - __import__("time").time()))
 
 
 @router.post("/refresh", response_model=TokenPair)
-def refresh_token(body: IntrospectRequest, db: Session = Depends(get_db)):
+async def refresh_token(body: IntrospectRequest, db: AsyncSession = Depends(get_read_db)):
     data = decode(body.token)
     if not data or data.get("typ") != "refresh":
         raise HTTPException(401, "Invalid refresh")
     user_id = int(data["sub"])
-    u = db.get(User, user_id)
-    if not u or not u.is_active:
+    u = await db.get(User, user_id)
+    if not u:
         raise HTTPException(401, "User disabled")
-    access, exp = create_access(u.id, u.roles or "")
+    activity.touch(u.id)
+    access, exp = create_access(u.id, u.role or "")
     new_refresh, _ = create_refresh(u.id)
     return TokenPair(
         access_token=access,
@@ -58,11 +115,13 @@ def refresh_token(body: IntrospectRequest, db: Session = Depends(get_db)):
     )
 
 
-@router.post("/introspect", response_model=IntrospectResponse)
-def introspect(body: IntrospectRequest):
-    data = decode(body.token)
+def _introspection(data: Optional[dict], touch: bool = False) -> IntrospectResponse:
     if not data or data.get("typ") != "access":
         return IntrospectResponse(active=False)
+    if touch:
+        # Сюда доходят только промахи кэша introspect гейтвея и токены, которые он не проверяет
+        # локально. Остальную активность гейтвей сообщает пачками через POST /auth/activity
+        activity.touch(int(data["sub"]))
     return IntrospectResponse(
         active=True,
         user_id=int(data["sub"]),
@@ -71,6 +130,95 @@ def introspect(body: IntrospectRequest):
     )
 
 
+@router.post("/introspect", response_model=IntrospectResponse)
+def introspect(body: IntrospectRequest):
+    return _introspection(decode(body.token), touch=True)
+
+
+@router.post("/introspect/batch", response_model=IntrospectBatchResponse)
+def introspect_batch(body: IntrospectBatchRequest):
+    """
+    Проверка пачки токенов одним запросом: один разбор тела, общий ключ,
+    ответ — по результату на каждый токен в том же порядке.
+    Активность не отмечается: пачками токены перепроверяют фоновые задачи, а не пользователи.
+    """
+    if len(body.tokens) > settings.INTROSPECT_BATCH_MAX:
+        raise HTTPException(413, f"Too many tokens (max {settings.INTROSPECT_BATCH_MAX})")
+    return IntrospectBatchResponse(results=[_introspection(d) for d in decode_many(body.tokens)])
+
+
+@router.post("/activity", status_code=204)
+def report_activity(body: ActivityReport, request: Request):
+    """
+    Внутренний: гейтвей раз в ACTIVITY_REPORT_INTERVAL_S присылает id пользователей, чьи токены
+    он проверил сам (локально или по кэшу introspect). Доступен только с X-Internal-Token.
+    """
+    token = request.headers.get("x-internal-token", "")
+    if not settings.INTERNAL_API_TOKEN or not hmac.compare_digest(token, settings.INTERNAL_API_TOKEN):
+        raise HTTPException(403, "Forbidden")
+    if len(body.user_ids) > settings.ACTIVITY_REPORT_MAX:
+        raise HTTPException(413, f"Too many ids (max {settings.ACTIVITY_REPORT_MAX})")
+    activity.touch_many(dict.fromkeys(body.user_ids))
+
+
+# Поля профиля, которые можно отдавать другим сервисам. Без email, телефона, студенческого
+# и OAuth id: эндпоинт доступен любому access-токену через гейтвей, а id идут подряд
+_PUBLIC_USER_FIELDS = (
+    "id", "avatar_url", "role", "institution", "faculty", "group_name", "created_at",
+)
+
+
+@router.post("/users/batch", response_model=UsersBatchResponse)
+async def users_batch(body: UsersBatchRequest, request: Request, db: AsyncSession = Depends(get_read_db)):
+    """
+    Публичные поля профилей пачкой — один SELECT ... WHERE id IN (...) вместо запроса на пользователя.
+    fields — проекция: из БД читаются только запрошенные колонки.
+    """
+    auth = request.headers.get("authorization", "")
+    tok = auth.split(" ", 1)[1] if auth.lower().startswith("bearer ") else None
+    data = decode(tok) if tok else None
+    if not data or data.get("typ") != "access":
+        raise HTTPException(401, "Invalid token")
+
+    ids = list(dict.fromkeys(body.ids))
+    if len(ids) > settings.USERS_BATCH_MAX:
+        raise HTTPException(413, f"Too many ids (max {settings.USERS_BATCH_MAX})")
+    fields = list(dict.fromkeys(body.fields or _PUBLIC_USER_FIELDS))
+    unknown = [f for f in fields if f not in _PUBLIC_USER_FIELDS]
+    if unknown:
+        raise HTTPException(422, f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in fields:
+        fields.insert(0, "id")
+    if not ids:
+        return UsersBatchResponse(users=[])
+
+    rows = (await db.execute(select(*(getattr(User, f) for f in fields)).where(User.id.in_(ids)))).mappings()
+    found = {row["id"]: dict(row) for row in rows}
+    # datetime сериализует response_model — прогонять строки через jsonable_encoder незачем
+    return UsersBatchResponse(
+        users=[found[i] for i in ids if i in found],
+        missing=[i for i in ids if i not in found],
+    )
+
+
+def _jwks_response() -> JSONResponse:
+    return JSONResponse(
+        keys.jwks(),
+        headers={"Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_S}"},
+    )
+
+
+@jwks_router.get("/.well-known/jwks.json")
+def jwks():
+    """Публичные ключи проверки подписи (по kid) для локальной проверки токенов в сервисах."""
+    return _jwks_response()
+
+
+@router.get("/.well-known/jwks.json")
+def auth_jwks():
+    return _jwks_response()
+
+
 @router.get("/me")
 def me(request: Request):
     auth = request.headers.get("authorization","")
@@ -81,7 +229,7 @@ def me(request: Request):
 
 
 @router.get("/profile")
-def me(request: Request, db: Session = Depends(get_db)):
+async def me(request: Request, db: AsyncSession = Depends(get_read_db)):
     """
     Возвращает всю информацию о текущем пользователе
     """
@@ -92,11 +240,17 @@ def me(request: Request, db: Session = Depends(get_db)):
         raise HTTPException(401, "Invalid token")
 
     user_id = int(data["sub"])
-    u = db.get(User, user_id)
+    activity.touch(user_id)
+    # Redis-клиент синхронный — в потоке, чтобы недоступный Redis не стопорил event loop
+    cached = await run_in_threadpool(profile_cache.get, user_id)
+    if cached is not None:
+        return cached
+
+    u = await db.get(User, user_id)
     if not u:
         raise HTTPException(404, "User not found")
 
-    return {
+    profile = jsonable_encoder({
         "id": u.id,
         "email": u.email,
         "phone": u.phone,
@@ -118,4 +272,6 @@ def me(request: Request, db: Session = Depends(get_db)):
         "github_id": u.github_id,
         "created_at": u.created_at,
         "updated_at": u.updated_at,
-    }
\ No newline at end of file
+    })
+    await run_in_threadpool(profile_cache.put, user_id, profile)
+    return profile
\ No newline at end of file
@@ -1,17 +1,53 @@
 from pydantic_settings import BaseSettings
 from datetime import timedelta
+from typing import Literal
 
 
 class Settings(BaseSettings):
     # DB / Redis
     DATABASE_URL: str = ""
     REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_TIMEOUT_S: float = 0.5      # Redis только ускоряет — ждать его дольше, чем БД, незачем
+
+    # Пул соединений (свой у sync- и async-движка; соединения открываются по требованию)
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_S: float = 5.0    # ожидание свободного соединения, дальше — ошибка
+    DB_POOL_RECYCLE_S: int = 1800     # пересоздавать соединения старше, чем idle-таймауты pgbouncer/LB
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100   # подготовленных выражений asyncpg на соединение; 0 — для pgbouncer
+
+    # Кэш GET /auth/profile
+    PROFILE_CACHE_ENABLED: bool = True
+    PROFILE_CACHE_TTL_S: int = 300
+
+    # Write-behind last_login_at / last_activity_at (app/services/activity.py)
+    ACTIVITY_TRACKING_ENABLED: bool = True
+    ACTIVITY_BUFFER: Literal["memory", "redis"] = "memory"   # redis — переживает перезапуск, общий для реплик
+    ACTIVITY_FLUSH_INTERVAL_S: float = 30.0
+    ACTIVITY_FLUSH_BATCH: int = 1000      # строк в одном UPDATE ... FROM (VALUES ...)
+    ACTIVITY_MAX_PENDING: int = 10000     # столько пользователей в буфере — сброс раньше интервала
+    ACTIVITY_REDIS_RETRY_S: float = 5.0   # сколько после ошибки Redis буферизовать касания в памяти
+    # Общий секрет с гейтвеем для POST /auth/activity (заголовок X-Internal-Token); пусто — эндпоинт выключен
+    INTERNAL_API_TOKEN: str = ""
+    ACTIVITY_REPORT_MAX: int = 10000      # id в одном POST /auth/activity
 
     # JWT
-    JWT_SECRET_KEY: str = "CHANGE_ME"
-    JWT_ALG: str = "HS256"
+    JWT_SECRET_KEY: str = "CHANGE_ME"   # только для HS*
+    JWT_ALG: str = "HS256"              # HS256 | RS256 | ES256
+    # RS*/ES*: каталог с приватными ключами <kid>.pem (см. app/utils/keys.py)
+    JWT_KEYS_DIR: str = ""
+    JWT_ACTIVE_KID: str = ""            # пусто — самый новый файл в каталоге
+    JWKS_MAX_AGE_S: int = 300           # Cache-Control для /.well-known/jwks.json
     ACCESS_EXPIRES_MIN: int = 30
     REFRESH_EXPIRES_DAYS: int = 30
+    # Пароли: стоимость bcrypt и отдельный ограниченный пул под хэширование
+    BCRYPT_ROUNDS: int = 12           # хэши с меньшей стоимостью пересчитываются при входе
+    HASH_POOL_SIZE: int = 4           # потоков bcrypt (~ число ядер)
+    HASH_QUEUE_MAX: int = 64          # ожидающих сверх пула; дальше — 503
+    HASH_RETRY_AFTER_S: int = 1
+    INTROSPECT_BATCH_MAX: int = 100   # токенов в одном POST /auth/introspect/batch
+    USERS_BATCH_MAX: int = 200        # id в одном POST /auth/users/batch
 
     model_config = {"env_file": ".env", "extra": "ignore"}
 
@@ -1,11 +1,66 @@
 # app/core/db.py
 from sqlalchemy import create_engine
+from sqlalchemy.engine import URL, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 from app.core.config import settings
 
-engine = create_engine(settings.DATABASE_URL, future=True)
+
+def _pool_kwargs(url: URL) -> dict:
+    # SQLite — файл на том же диске, пул ему не нужен
+    if url.get_backend_name() == "sqlite":
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_S,
+        "pool_recycle": settings.DB_POOL_RECYCLE_S,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+
+def _sync_url(raw: str) -> URL:
+    url = make_url(raw)
+    if url.drivername == "postgresql":
+        # В requirements — psycopg2; SQLAlchemy 2.1 по умолчанию ищет psycopg 3
+        url = url.set(drivername="postgresql+psycopg2")
+    return url
+
+
+def _async_url(raw: str) -> URL:
+    url = make_url(raw)
+    if url.get_backend_name() == "postgresql":
+        return url.set(drivername="postgresql+asyncpg").update_query_dict(
+            {"prepared_statement_cache_size": str(settings.DB_STATEMENT_CACHE_SIZE)}
+        )
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+def _async_connect_args(url: URL) -> dict:
+    if url.get_driver_name() == "asyncpg":
+        # Кэш самого asyncpg; 0 — для pgbouncer в режиме transaction
+        return {"statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE}
+    return {}
+
+
+# Синхронный движок — только под create_all и фоновые задачи (сброс активности)
+_sync = _sync_url(settings.DATABASE_URL)
+engine = create_engine(_sync, future=True, **_pool_kwargs(_sync))
 SessionLocal = sessionmaker(engine, autoflush=False, autocommit=False)
 
+# Маршруты /auth работают через asyncpg: запрос к БД не занимает поток из threadpool (их 40)
+_async = _async_url(settings.DATABASE_URL)
+async_engine = create_async_engine(_async, connect_args=_async_connect_args(_async), **_pool_kwargs(_async))
+# expire_on_commit=False: после commit атрибуты читаются без неявного запроса (в async он невозможен)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+# Для чтений — AUTOCOMMIT на том же пуле: asyncpg не шлёт BEGIN и ROLLBACK отдельными
+# round-trip'ами вокруг каждого SELECT. Писать — только через AsyncSessionLocal
+AsyncReadSessionLocal = async_sessionmaker(
+    async_engine.execution_options(isolation_level="AUTOCOMMIT"), autoflush=False, expire_on_commit=False
+)
+
 
 class Base(DeclarativeBase):
     pass
@@ -14,3 +69,7 @@ class Base(DeclarativeBase):
 def init_db():
     from app.models.user import User  # импорт всех моделей
     Base.metadata.create_all(bind=engine)
+
+
+async def dispose() -> None:
+    await async_engine.dispose()
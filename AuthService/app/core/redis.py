@@ -1,6 +1,11 @@
 import redis
 from app.core.config import settings
-r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+r = redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_timeout=settings.REDIS_TIMEOUT_S,
+    socket_connect_timeout=settings.REDIS_TIMEOUT_S,
+)
 
 def revoke_refresh(jti: str, exp: int):
     ttl = max(exp - __import__("time").time(), 0)
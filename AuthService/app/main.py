@@ -1,17 +1,31 @@
 from fastapi import FastAPI
-from app.api.routes import router
+from app.api.routes import router, jwks_router
 
 from app.core.db import Base, engine
-from app.core.db import init_db
+from app.core.db import dispose, init_db
+from app.services import activity, profile_cache
+from app.utils import security
 
 
 app = FastAPI(title="AuthService", version="0.1.0")
 Base.metadata.create_all(bind=engine)
 app.include_router(router)
+app.include_router(jwks_router)
+app.add_event_handler("startup", activity.start)
+app.add_event_handler("shutdown", activity.stop)
+app.add_event_handler("shutdown", security.shutdown)
+app.add_event_handler("shutdown", dispose)
 
 
 init_db()
 
 
 @app.get("/health")
-def health(): return {"status": "ok", "service": "auth"}
+def health():
+    return {
+        "status": "ok",
+        "service": "auth",
+        "hash_pool": security.pool_stats(),
+        "profile_cache": profile_cache.stats(),
+        "activity": activity.stats(),
+    }
@@ -26,3 +26,25 @@ class IntrospectResponse(BaseModel):
     user_id: Optional[int] = None
     roles: List[str] = []
     exp: Optional[int] = None
+
+
+class IntrospectBatchRequest(BaseModel):
+    tokens: List[str]
+
+
+class IntrospectBatchResponse(BaseModel):
+    results: List[IntrospectResponse]  # в порядке tokens запроса
+
+
+class UsersBatchRequest(BaseModel):
+    ids: List[int]
+    fields: Optional[List[str]] = None   # None — все публичные поля
+
+
+class ActivityReport(BaseModel):
+    user_ids: List[int]
+
+
+class UsersBatchResponse(BaseModel):
+    users: List[dict]      # в порядке ids запроса, без дублей
+    missing: List[int] = []
@@ -0,0 +1,264 @@
+# app/services/activity.py
+"""
+Write-behind учёт активности: last_login_at / last_activity_at.
+
+touch() только запоминает время в буфере (память процесса или Redis), в БД ничего не пишет.
+Фоновая задача раз в ACTIVITY_FLUSH_INTERVAL_S сбрасывает буфер пачками одним
+    WITH v(id, login_at, activity_at) AS (VALUES ...) UPDATE users ... FROM v
+на ACTIVITY_FLUSH_BATCH строк. Время в БД только растёт — повторный или запоздавший сброс
+не откатывает его назад.
+
+Долговечность (ACTIVITY_BUFFER):
+    memory — при падении процесса теряется не больше интервала сброса;
+    redis  — буфер переживает перезапуск и общий для всех реплик; сброс at-least-once.
+При ошибке Redis касание остаётся в памяти процесса и уходит со следующим сбросом.
+Клиент Redis синхронный: из event loop запись в Redis уходит в пул потоков, а после ошибки
+ACTIVITY_REDIS_RETRY_S касания пишутся сразу в память, не копя очередь на мёртвый Redis.
+
+Запросы с токеном, проверенным в гейтвее локально или по кэшу introspect, сюда не доходят —
+их гейтвей сообщает пачкой раз в ACTIVITY_REPORT_INTERVAL_S (POST /auth/activity → touch_many).
+Точность last_activity_at — интервал отчёта гейтвея плюс интервал сброса.
+
+После сброса у закэшированных профилей обновляются только last_*_at (profile_cache.update_activity).
+"""
+import asyncio
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.db import engine
+from app.core.redis import r
+from app.services import profile_cache
+
+log = logging.getLogger(__name__)
+
+# user_id -> [last_login_at, last_activity_at]
+_buffer: Dict[int, List[Optional[datetime]]] = {}
+_lock = threading.Lock()
+_wakeup: Optional[asyncio.Event] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_task: Optional[asyncio.Task] = None
+_redis_down_until = 0.0
+
+# Хэши Redis: user_id -> ISO-время; на время сброса переименовываются в *:flushing
+_REDIS_KEYS = {"login": "activity:login", "activity": "activity:seen"}
+
+flushed_rows = 0
+flushes = 0
+errors = 0
+
+
+def _now() -> datetime:
+    # Колонки без таймзоны — храним UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _remember(user_ids: List[int], ts: datetime, login: bool) -> int:
+    with _lock:
+        for user_id in user_ids:
+            entry = _buffer.setdefault(user_id, [None, None])
+            if login:
+                entry[0] = ts
+            entry[1] = ts
+        return len(_buffer)
+
+
+def _touch_memory(user_ids: List[int], ts: datetime, login: bool) -> None:
+    pending = _remember(user_ids, ts, login)
+    if pending >= settings.ACTIVITY_MAX_PENDING and _loop is not None:
+        # Буфер разросся — сбрасываем, не дожидаясь интервала (touch зовут и из потоков)
+        _loop.call_soon_threadsafe(_wakeup.set)
+
+
+def _touch_redis(user_ids: List[int], ts: datetime, login: bool) -> None:
+    global errors, _redis_down_until
+    try:
+        mapping = dict.fromkeys(user_ids, ts.isoformat())
+        with r.pipeline(transaction=False) as p:
+            if login:
+                p.hset(_REDIS_KEYS["login"], mapping=mapping)
+            p.hset(_REDIS_KEYS["activity"], mapping=mapping)
+            p.execute()
+        return
+    except Exception as e:
+        errors += 1
+        _redis_down_until = time.monotonic() + settings.ACTIVITY_REDIS_RETRY_S
+        log.warning("Activity touch to Redis failed, buffering in memory: %s", e)
+    _touch_memory(user_ids, ts, login)
+
+
+def touch_many(user_ids: Iterable[int], login: bool = False) -> None:
+    """Отметить активность пачки пользователей. Дёшево: в БД не пишет и loop не блокирует."""
+    if not settings.ACTIVITY_TRACKING_ENABLED:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ts = _now()
+    if settings.ACTIVITY_BUFFER != "redis" or time.monotonic() < _redis_down_until:
+        _touch_memory(user_ids, ts, login)
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Обычный поток (sync-маршрут в threadpool) — пишем сразу
+        _touch_redis(user_ids, ts, login)
+        return
+    loop.run_in_executor(None, _touch_redis, user_ids, ts, login)
+
+
+def touch(user_id: int, login: bool = False) -> None:
+    """Отметить активность пользователя (login=True — ещё и вход)."""
+    touch_many([user_id], login)
+
+
+def _drain_memory() -> Dict[int, List[Optional[datetime]]]:
+    global _buffer
+    with _lock:
+        drained, _buffer = _buffer, {}
+    return drained
+
+
+def _claim_redis() -> Dict[int, List[Optional[datetime]]]:
+    """
+    Забрать накопленное в Redis: RENAME в *:flushing, чтобы новые касания шли в свежий хэш.
+    Если предыдущий сброс упал и *:flushing остался — сначала дочищаем его.
+    """
+    rows: Dict[int, List[Optional[datetime]]] = {}
+    for slot, key in enumerate((_REDIS_KEYS["login"], _REDIS_KEYS["activity"])):
+        claimed = f"{key}:flushing"
+        if not r.exists(claimed):
+            try:
+                r.rename(key, claimed)
+            except Exception:   # ключа нет — касаний не было
+                continue
+        for uid, iso in r.hgetall(claimed).items():
+            rows.setdefault(int(uid), [None, None])[slot] = datetime.fromisoformat(iso)
+    return rows
+
+
+def _release_redis() -> None:
+    r.delete(*(f"{key}:flushing" for key in _REDIS_KEYS.values()))
+
+
+def _merge(into: Dict[int, List[Optional[datetime]]], rows: Dict[int, List[Optional[datetime]]]) -> None:
+    for uid, (login_at, activity_at) in rows.items():
+        entry = into.setdefault(uid, [None, None])
+        entry[0] = max(filter(None, (entry[0], login_at)), default=None)
+        entry[1] = max(filter(None, (entry[1], activity_at)), default=None)
+
+
+def _update(rows: List[Tuple[int, Optional[datetime], Optional[datetime]]]) -> None:
+    # В Postgres у NULL в VALUES нет типа — приводим явно; в SQLite CAST AS TIMESTAMP испортит строку
+    ts = "CAST({} AS TIMESTAMP)" if engine.dialect.name == "postgresql" else "{}"
+    values, params = [], {}
+    for i, (uid, login_at, activity_at) in enumerate(rows):
+        values.append(f"(:id{i}, {ts.format(f':l{i}')}, {ts.format(f':a{i}')})")
+        params.update({f"id{i}": uid, f"l{i}": login_at, f"a{i}": activity_at})
+    # NULL в v.* не проходит сравнение и оставляет текущее значение
+    sql = text(
+        f"WITH v(id, login_at, activity_at) AS (VALUES {', '.join(values)}) "
+        "UPDATE users SET "
+        "last_login_at = CASE WHEN users.last_login_at IS NULL OR v.login_at > users.last_login_at "
+        "THEN v.login_at ELSE users.last_login_at END, "
+        "last_activity_at = CASE WHEN users.last_activity_at IS NULL OR v.activity_at > users.last_activity_at "
+        "THEN v.activity_at ELSE users.last_activity_at END "
+        "FROM v WHERE users.id = v.id"
+    )
+    with engine.begin() as conn:
+        conn.execute(sql, params)
+
+
+def flush() -> int:
+    """Сбросить буфер в БД. Синхронная — из async-кода звать через threadpool. Возвращает число строк."""
+    global flushed_rows, flushes, errors
+    pending = _drain_memory()
+    use_redis = settings.ACTIVITY_BUFFER == "redis"
+    if use_redis:
+        try:
+            _merge(pending, _claim_redis())
+        except Exception as e:
+            errors += 1
+            use_redis = False
+            log.warning("Activity claim from Redis failed: %s", e)
+    if not pending:
+        return 0
+
+    items = sorted((uid, v[0], v[1]) for uid, v in pending.items())
+    done = 0
+    try:
+        for i in range(0, len(items), settings.ACTIVITY_FLUSH_BATCH):
+            chunk = items[i:i + settings.ACTIVITY_FLUSH_BATCH]
+            _update(chunk)
+            done += len(chunk)
+    except Exception as e:
+        errors += 1
+        log.error("Activity flush failed, %d rows kept for retry: %s", len(items) - done, e)
+        # Несброшенное возвращаем в память; в Redis *:flushing не удаляется и перечитается
+        with _lock:
+            _merge(_buffer, {uid: [l, a] for uid, l, a in items[done:]})
+        use_redis = False
+    # last_login_at / last_activity_at входят в ответ /auth/profile — обновляем их в кэше
+    profile_cache.update_activity(items[:done])
+
+    if use_redis:
+        try:
+            _release_redis()
+        except Exception as e:
+            errors += 1
+            log.warning("Activity release in Redis failed: %s", e)
+    flushes += 1
+    flushed_rows += done
+    return done
+
+
+async def _flush_loop() -> None:
+    while True:
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.ACTIVITY_FLUSH_INTERVAL_S)
+        except asyncio.TimeoutError:
+            pass
+        _wakeup.clear()
+        try:
+            await run_in_threadpool(flush)
+        except Exception:
+            log.exception("Activity flush loop error")
+
+
+async def start() -> None:
+    global _wakeup, _loop, _task
+    if not settings.ACTIVITY_TRACKING_ENABLED or _task is not None:
+        return
+    _wakeup = asyncio.Event()
+    _loop = asyncio.get_running_loop()
+    _task = asyncio.create_task(_flush_loop())
+
+
+async def stop() -> None:
+    """Остановить фоновый сброс и сбросить остаток — иначе в режиме memory он потеряется."""
+    global _task, _loop
+    _loop = None
+    if _task is not None:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+    await run_in_threadpool(flush)
+
+
+def stats() -> dict:
+    return {
+        "buffer": settings.ACTIVITY_BUFFER,
+        "pending": len(_buffer),
+        "flushes": flushes,
+        "flushed_rows": flushed_rows,
+        "errors": errors,
+    }
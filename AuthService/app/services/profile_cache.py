@@ -0,0 +1,157 @@
+# app/services/profile_cache.py
+"""
+Read-through кэш GET /auth/profile в Redis.
+
+Запись сбрасывается после коммита любой транзакции, изменившей или удалившей User
+(события сессии SQLAlchemy), так что кэш не переживает изменение строки дольше коммита.
+Массовые UPDATE в обход ORM должны звать invalidate() сами.
+Ошибки Redis не ломают запрос: чтение уходит в БД.
+
+last_login_at / last_activity_at лежат отдельными ключами рядом с профилем: сброс активности
+(раз в ACTIVITY_FLUSH_INTERVAL_S) обновляет только их через update_activity(), а не выбивает
+весь профиль — иначе кэш жил бы не дольше интервала сброса.
+"""
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.redis import r
+from app.models.user import User
+
+log = logging.getLogger(__name__)
+
+_PREFIX = "profile:"
+_ACTIVITY_FIELDS = ("last_login_at", "last_activity_at")
+
+hits = 0
+misses = 0
+errors = 0
+
+
+def _key(user_id: int) -> str:
+    return f"{_PREFIX}{user_id}"
+
+
+def _keys(user_id: int) -> List[str]:
+    """Профиль без last_*_at и по ключу на каждое из полей активности."""
+    return [_key(user_id)] + [f"{_key(user_id)}:{field}" for field in _ACTIVITY_FIELDS]
+
+
+def get(user_id: int) -> Optional[dict]:
+    global hits, misses, errors
+    if not settings.PROFILE_CACHE_ENABLED:
+        return None
+    try:
+        raw = r.mget(_keys(user_id))
+    except Exception as e:
+        errors += 1
+        log.warning("Profile cache get failed: %s", e)
+        return None
+    if any(v is None for v in raw):
+        misses += 1
+        return None
+    hits += 1
+    profile = json.loads(raw[0])
+    for field, value in zip(_ACTIVITY_FIELDS, raw[1:]):
+        profile[field] = json.loads(value)
+    return profile
+
+
+def put(user_id: int, profile: dict) -> None:
+    """profile — уже JSON-совместимый (jsonable_encoder)."""
+    global errors
+    if not settings.PROFILE_CACHE_ENABLED:
+        return
+    profile = dict(profile)
+    values = [profile.pop(field, None) for field in _ACTIVITY_FIELDS]
+    keys = _keys(user_id)
+    try:
+        with r.pipeline(transaction=False) as p:
+            p.set(keys[0], json.dumps(profile), ex=settings.PROFILE_CACHE_TTL_S)
+            for key, value in zip(keys[1:], values):
+                p.set(key, json.dumps(value), ex=settings.PROFILE_CACHE_TTL_S)
+            p.execute()
+    except Exception as e:
+        errors += 1
+        log.warning("Profile cache set failed: %s", e)
+
+
+def update_activity(rows: Iterable[Tuple[int, Optional[datetime], Optional[datetime]]]) -> None:
+    """
+    Обновить last_login_at / last_activity_at у уже закэшированных профилей после сброса
+    активности. SET XX KEEPTTL: новых записей не создаёт и TTL профиля не продлевает.
+    """
+    global errors
+    if not settings.PROFILE_CACHE_ENABLED:
+        return
+    try:
+        with r.pipeline(transaction=False) as p:
+            for uid, *values in rows:
+                for key, ts in zip(_keys(uid)[1:], values):
+                    if ts is not None:
+                        p.set(key, json.dumps(ts.isoformat()), xx=True, keepttl=True)
+            p.execute()
+    except Exception as e:
+        errors += 1
+        log.warning("Profile cache activity update failed: %s", e)
+
+
+def invalidate(user_ids: Iterable[int]) -> None:
+    global errors
+    keys = [key for uid in user_ids for key in _keys(uid)]
+    if not keys or not settings.PROFILE_CACHE_ENABLED:
+        return
+    try:
+        r.delete(*keys)
+    except Exception as e:
+        errors += 1
+        log.warning("Profile cache invalidate failed: %s", e)
+
+
+def stats() -> dict:
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "errors": errors,
+        "hit_ratio": round(hits / total, 4) if total else 0.0,
+    }
+
+
+# --- Инвалидация по изменениям User ---
+# Ключи собираем на flush, удаляем после commit: если удалить раньше, параллельное чтение
+# успеет положить в кэш ещё не закоммиченное старое состояние строки
+
+@event.listens_for(Session, "after_flush")
+def _collect(session: Session, _flush_context) -> None:
+    changed = session.info.setdefault("profile_cache_invalidate", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User) and obj.id is not None:
+            changed.add(obj.id)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session: Session) -> None:
+    changed = session.info.pop("profile_cache_invalidate", None)
+    if not changed:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        # Синхронная сессия в своём потоке (сброс активности, скрипты) — удаляем сразу
+        invalidate(changed)
+        return
+    # Коммит AsyncSession: слушатель исполняется в потоке event loop, а клиент Redis
+    # синхронный — удаление уходит в пул потоков, чтобы не блокировать loop
+    loop.run_in_executor(None, invalidate, changed)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard(session: Session) -> None:
+    session.info.pop("profile_cache_invalidate", None)
@@ -0,0 +1,126 @@
+# app/utils/keys.py
+"""
+Ключи подписи для асимметричных алгоритмов (RS256, ES256).
+
+Ключи лежат в JWT_KEYS_DIR файлами <kid>.pem (приватные). Подписывает ключ JWT_ACTIVE_KID
+(по умолчанию — самый новый файл), в JWKS публикуются все — так токены, выданные старым
+ключом, продолжают проверяться, пока не истекут.
+
+Ротация:
+    python -m app.utils.keys generate --dir keys --alg RS256   # новый ключ
+    # JWT_ACTIVE_KID=<новый kid> (или просто перезапуск — возьмётся самый новый файл)
+    # старый <kid>.pem удалить не раньше, чем через REFRESH_EXPIRES_DAYS
+"""
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from jose import jwk
+from jose.backends.base import Key
+
+from app.core.config import settings
+
+# Как часто проверять каталог ключей на изменения
+_RELOAD_CHECK_S = 5.0
+
+
+def is_asymmetric() -> bool:
+    return not settings.JWT_ALG.upper().startswith("HS")
+
+
+class Keyring:
+    def __init__(self, directory: str, alg: str, active_kid: str = ""):
+        self.alg = alg
+        self.keys: Dict[str, Key] = {}
+        mtimes = {}
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".pem"):
+                continue
+            kid = name[:-4]
+            path = os.path.join(directory, name)
+            with open(path, encoding="utf-8") as f:
+                self.keys[kid] = jwk.construct(f.read(), alg)
+            mtimes[kid] = os.path.getmtime(path)
+        if not self.keys:
+            raise RuntimeError(f"No signing keys (*.pem) in {directory}")
+        self.active_kid = active_kid or max(mtimes, key=mtimes.get)
+        if self.active_kid not in self.keys:
+            raise RuntimeError(f"JWT_ACTIVE_KID {self.active_kid!r} not found in {directory}")
+        self._public = {kid: key.public_key() for kid, key in self.keys.items()}
+
+    def signing_key(self) -> Tuple[str, Key]:
+        return self.active_kid, self.keys[self.active_kid]
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Key]:
+        return self._public.get(kid) if kid else None
+
+    def jwks(self) -> dict:
+        keys = []
+        for kid, key in self._public.items():
+            data = key.to_dict()
+            data.update(kid=kid, use="sig", alg=self.alg)
+            keys.append(data)
+        return {"keys": keys}
+
+
+_keyring: Optional[Keyring] = None
+_dir_mtime = 0.0
+_checked_at = 0.0
+_lock = threading.Lock()
+
+
+def keyring() -> Keyring:
+    """Загруженные ключи; перечитываются, если содержимое каталога поменялось."""
+    global _keyring, _dir_mtime, _checked_at
+    now = time.monotonic()
+    if _keyring is not None and now - _checked_at < _RELOAD_CHECK_S:
+        return _keyring
+    with _lock:
+        _checked_at = now
+        mtime = os.path.getmtime(settings.JWT_KEYS_DIR)
+        if _keyring is None or mtime != _dir_mtime:
+            _keyring = Keyring(settings.JWT_KEYS_DIR, settings.JWT_ALG, settings.JWT_ACTIVE_KID)
+            _dir_mtime = mtime
+    return _keyring
+
+
+def jwks() -> dict:
+    return keyring().jwks() if is_asymmetric() else {"keys": []}
+
+
+def _generate(directory: str, alg: str) -> str:
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+    if alg.upper().startswith("RS"):
+        private = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif alg.upper() == "ES256":
+        private = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise SystemExit(f"Unsupported algorithm: {alg}")
+    pem = private.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    kid = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{kid}.pem")
+    with open(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), "wb") as f:
+        f.write(pem)
+    return kid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    gen = sub.add_parser("generate")
+    gen.add_argument("--dir", default=settings.JWT_KEYS_DIR or "keys")
+    gen.add_argument("--alg", default="RS256")
+    args = parser.parse_args()
+    print(_generate(args.dir, args.alg))
+
+
+if __name__ == "__main__":
+    main()
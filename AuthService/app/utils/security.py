@@ -1,6 +1,69 @@
 # app/utils/security.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
-pwd = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+from app.core.config import settings
+
+# min_rounds: хэши со стоимостью ниже текущей считаются устаревшими и пересчитываются при входе
+pwd = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+)
 
 def hash_password(p: str) -> str: return pwd.hash(p)
 def verify_password(p: str, hp: str) -> bool: return pwd.verify(p, hp)
+
+
+class HasherBusy(Exception):
+    """Очередь на хэширование заполнена — запрос лучше отклонить сразу, чем держать."""
+
+
+# Отдельный пул под bcrypt: шторм логинов не занимает общий threadpool Starlette,
+# на котором живут остальные sync-эндпоинты (в том числе /auth/introspect).
+# bcrypt отпускает GIL, так что потоки дают настоящий параллелизм
+_executor = ThreadPoolExecutor(max_workers=settings.HASH_POOL_SIZE, thread_name_prefix="bcrypt")
+_pending = 0
+
+
+@contextmanager
+def admit():
+    """
+    Место в очереди на весь login/register, включая запросы к БД до хэширования:
+    лишние запросы отклоняются до того, как займут общий threadpool.
+    """
+    global _pending
+    if _pending >= settings.HASH_POOL_SIZE + settings.HASH_QUEUE_MAX:
+        raise HasherBusy()
+    _pending += 1
+    try:
+        yield
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(p: str) -> str:
+    return await asyncio.get_running_loop().run_in_executor(_executor, pwd.hash, p)
+
+
+async def verify_and_update_async(p: str, hp: str) -> Tuple[bool, Optional[str]]:
+    """(пароль верен, новый хэш или None, если пересчитывать не нужно)."""
+    return await asyncio.get_running_loop().run_in_executor(_executor, pwd.verify_and_update, p, hp)
+
+
+def pool_stats() -> dict:
+    return {
+        "workers": settings.HASH_POOL_SIZE,
+        "pending": _pending,
+        "queue_max": settings.HASH_QUEUE_MAX,
+        "rounds": settings.BCRYPT_ROUNDS,
+    }
+
+
+def shutdown() -> None:
+    _executor.shutdown(wait=False, cancel_futures=True)
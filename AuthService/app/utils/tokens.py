@@ -1,14 +1,22 @@
 # app/utils/tokens.py
 from datetime import datetime, timedelta, timezone
-from jose import jwt
-from typing import Tuple, Optional
+from functools import lru_cache
+from jose import jwk, jwt
+from jose.backends.base import Key
+from typing import Iterable, List, Tuple, Optional
 from app.core.config import settings
+from app.utils import keys
 
 def _make(payload: dict, delta: timedelta) -> Tuple[str,int]:
     now = datetime.now(timezone.utc)
     exp = now + delta
     to_encode = {**payload, "iat": int(now.timestamp()), "exp": int(exp.timestamp())}
-    token = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALG)
+    if keys.is_asymmetric():
+        # kid в заголовке — по нему проверяющие выбирают ключ из JWKS
+        kid, key = keys.keyring().signing_key()
+        token = jwt.encode(to_encode, key, algorithm=settings.JWT_ALG, headers={"kid": kid})
+    else:
+        token = jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALG)
     return token, int(exp.timestamp())
 
 def create_access(user_id: int, roles: str) -> Tuple[str,int]:
@@ -17,8 +25,41 @@ def create_access(user_id: int, roles: str) -> Tuple[str,int]:
 def create_refresh(user_id: int) -> Tuple[str,int]:
     return _make({"sub": str(user_id), "typ":"refresh"}, settings.refresh_delta)
 
+@lru_cache(maxsize=4)
+def _secret_key(secret: str, alg: str) -> Key:
+    return jwk.construct(secret, alg)
+
+
+def _verification_key(token: str) -> Optional[Key]:
+    """HS* — общий секрет; RS*/ES* — публичный ключ по kid из заголовка токена."""
+    if not keys.is_asymmetric():
+        return _secret_key(settings.JWT_SECRET_KEY, settings.JWT_ALG)
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except Exception:
+        return None
+    return keys.keyring().verification_key(kid)
+
+
 def decode(token: str) -> Optional[dict]:
+    key = _verification_key(token)
+    if key is None:
+        return None
     try:
-        return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALG])
+        return jwt.decode(token, key, algorithms=[settings.JWT_ALG])
     except Exception:
         return None
+
+
+def decode_many(tokens: Iterable[str]) -> List[Optional[dict]]:
+    """
+    Пакетная проверка: ключи собираются один раз и переиспользуются,
+    одинаковые токены в пакете декодируются один раз.
+    """
+    seen = {}
+    result = []
+    for token in tokens:
+        if token not in seen:
+            seen[token] = decode(token)
+        result.append(seen[token])
+    return result
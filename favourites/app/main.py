@@ -1,9 +1,15 @@
 from fastapi import FastAPI
 from app.api import favourites
 from app.core.db import Base, engine
+from app.services import external_api
 
 app = FastAPI(title="Favourites Service")
 
 Base.metadata.create_all(bind=engine)
 
 app.include_router(favourites.router, prefix="/favourites")
+
+
+@app.on_event("shutdown")
+async def _close_clients():
+    await external_api.close()
@@ -1,16 +1,63 @@
+import logging
+from typing import Dict, Iterable, List, Optional
+
 import httpx
 from app.core.config import settings
 
+log = logging.getLogger(__name__)
+
+# Должно совпадать с USERS_BATCH_MAX в AuthService
+USERS_BATCH_MAX = 200
+
+
+# Общий клиент на процесс: соединения к гейтвею переиспользуются (keep-alive),
+# а не открываются заново на каждый вызов
+_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(5.0, connect=2.0),
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+)
+
+
+async def get_users_data(
+    user_ids: Iterable[int], fields: Optional[List[str]] = None, token: Optional[str] = None
+) -> Dict[int, dict]:
+    """
+    Публичные поля профилей пачкой: один POST /auth/users/batch на страницу вместо запроса
+    на каждого автора. Возвращает {user_id: профиль}; ненайденных в словаре нет.
+    token — Bearer пользователя, от имени которого идёт запрос (эндпоинт требует авторизацию).
+    Отказ AuthService — httpx.HTTPError, а не неполный словарь: иначе его не отличить
+    от несуществующих пользователей.
+    """
+    ids = list(dict.fromkeys(user_ids))
+    if not ids:
+        return {}
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    users: Dict[int, dict] = {}
+    for i in range(0, len(ids), USERS_BATCH_MAX):
+        resp = await _client.post(
+            f"{settings.AUTH_SERVICE_URL}/users/batch",
+            json={"ids": ids[i:i + USERS_BATCH_MAX], "fields": fields},
+            headers=headers,
+        )
+        if resp.status_code != 200:
+            log.warning("POST /users/batch failed: HTTP %s for %d ids", resp.status_code, len(ids[i:i + USERS_BATCH_MAX]))
+            raise httpx.HTTPStatusError(
+                f"users/batch returned {resp.status_code}", request=resp.request, response=resp
+            )
+        users.update((u["id"], u) for u in resp.json()["users"])
+    return users
+
+
 async def get_book_data(book_id: int):
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{settings.CATALOG_SERVICE_URL}/books/{book_id}")
-        if resp.status_code == 200:
-            return resp.json()
-        return None
-
-async def get_user_data(user_id: int):
-    async with httpx.AsyncClient() as client:
-        resp = await client.get(f"{settings.USER_SERVICE_URL}/users/{user_id}")
-        if resp.status_code == 200:
-            return resp.json()
-        return None
+    resp = await _client.get(f"{settings.CATALOG_SERVICE_URL}/books/{book_id}")
+    if resp.status_code == 200:
+        return resp.json()
+    return None
+
+
+async def get_user_data(user_id: int, token: Optional[str] = None):
+    return (await get_users_data([user_id], token=token)).get(user_id)
+
+
+async def close() -> None:
+    await _client.aclose()
@@ -1,66 +1,140 @@
-from typing import List
+from typing import Dict, List, Optional
 from pydantic import BaseModel
 from fastapi import Depends, HTTPException, Request
+import asyncio
+import atexit
 import httpx
+import jwt
 import json
 import logging
+import os
+import queue
+import time
+import zlib
+from logging.handlers import QueueHandler, QueueListener
 
 from app.core.config import settings
 
 # --- Настройка логгера ---
+# Запись в поток делает отдельный поток QueueListener — event loop не блокируется на I/O
 logger = logging.getLogger("authz")
-logger.setLevel(logging.DEBUG)
-handler = logging.StreamHandler()
-formatter = logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s")
-handler.setFormatter(formatter)
+logger.setLevel(os.getenv("AUTHZ_LOG_LEVEL", "INFO").upper())
 if not logger.handlers:
-    logger.addHandler(handler)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("[%(asctime)s] [%(levelname)s] %(message)s"))
+    _log_queue = queue.SimpleQueue()
+    _listener = QueueListener(_log_queue, handler)
+    _listener.start()
+    atexit.register(_listener.stop)
+    logger.addHandler(QueueHandler(_log_queue))
+
+# Доля запросов с подробным DEBUG-логом; выбор по X-Request-ID от гейтвея,
+# чтобы все строки одного запроса попадали в лог вместе
+_VERBOSE_SAMPLE_RATE = float(os.getenv("AUTHZ_LOG_SAMPLE_RATE", "0.01"))
 # --------------------------
 
 _INTROSPECT_URL = (str(settings.AUTH_SERVICE_URL).rstrip("/") + "/introspect")
 _client = httpx.AsyncClient(timeout=10.0)
 
+# Локальная проверка подписи по JWKS AuthService (RS256/ES256, токены с kid) — без похода в introspect.
+# Токены без kid (HS256) и с неизвестным kid по-прежнему проверяет introspect
+_JWKS_URL = os.getenv("AUTH_JWKS_URL", str(settings.AUTH_SERVICE_URL).rstrip("/") + "/.well-known/jwks.json")
+_JWKS_TTL_S = float(os.getenv("AUTH_JWKS_TTL_S", "300"))
+_JWKS_MIN_REFRESH_S = 10.0  # не чаще: перебор случайных kid не должен превращаться в запросы к AuthService
+_jwks_keys: Dict[str, jwt.PyJWK] = {}
+_jwks_fetched_at = float("-inf")
+_jwks_lock = asyncio.Lock()
+
 
 class AuthUser(BaseModel):
     user_id: int
     roles: List[str] = []
 
 
+async def _jwks_key(kid: str) -> Optional[jwt.PyJWK]:
+    """Ключ по kid из кэша JWKS; набор перечитывается по TTL или при незнакомом kid."""
+    global _jwks_keys, _jwks_fetched_at
+    age = time.monotonic() - _jwks_fetched_at
+    if (kid in _jwks_keys and age < _JWKS_TTL_S) or age < _JWKS_MIN_REFRESH_S:
+        return _jwks_keys.get(kid)
+    async with _jwks_lock:
+        if time.monotonic() - _jwks_fetched_at >= _JWKS_MIN_REFRESH_S:
+            _jwks_fetched_at = time.monotonic()
+            try:
+                resp = await _client.get(_JWKS_URL)
+                resp.raise_for_status()
+                _jwks_keys = {k["kid"]: jwt.PyJWK(k) for k in resp.json().get("keys", []) if k.get("kid")}
+            except (httpx.HTTPError, ValueError, KeyError, jwt.PyJWKError) as e:
+                # Остаёмся на прежнем наборе ключей
+                logger.warning("JWKS fetch failed: %s", e)
+    return _jwks_keys.get(kid)
+
+
+async def _verify_local(token: str) -> Optional[AuthUser]:
+    """Проверка подписи на месте. None — локально решить нельзя, решает introspect."""
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except jwt.DecodeError:
+        return None
+    if not kid:
+        return None
+    key = await _jwks_key(kid)
+    if key is None:
+        return None
+
+    try:
+        # Алгоритм берём из JWKS, а не из заголовка токена
+        data = jwt.decode(token, key.key, algorithms=[key.algorithm_name], options={"require": ["exp", "sub"]})
+    except jwt.ExpiredSignatureError:
+        logger.warning("Token inactive")
+        raise HTTPException(status_code=401, detail="Token inactive")
+    except jwt.InvalidTokenError as e:
+        logger.warning(f"Invalid token: {e}")
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    if data.get("typ") != "access":
+        logger.warning("Token inactive")
+        raise HTTPException(status_code=401, detail="Token inactive")
+    return AuthUser(user_id=int(data["sub"]), roles=data.get("roles") or [])
+
+
+def _verbose(request: Request) -> bool:
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    rid = request.headers.get("x-request-id")
+    if rid:
+        return (zlib.crc32(rid.encode("utf-8")) % 10000) < _VERBOSE_SAMPLE_RATE * 10000
+    return _VERBOSE_SAMPLE_RATE >= 1.0
+
+
 async def get_current_user(request: Request) -> AuthUser:
     """
     Проверяет токен и возвращает текущего пользователя.
-    Дополнительно логирует всё, что пришло от фронтенда.
+    Тело запроса не читается; подробный лог — только для сэмплированных запросов.
     """
-    # --- Логируем всю информацию о запросе ---
-    try:
-        body_bytes = await request.body()
-        body_text = body_bytes.decode("utf-8") if body_bytes else "(empty)"
-    except Exception as e:
-        body_text = f"(error reading body: {e})"
-
-    logger.debug("=== Incoming request from frontend ===")
-    logger.debug(f"Method: {request.method}")
-    logger.debug(f"URL: {request.url}")
-    logger.debug(f"Headers: {dict(request.headers)}")
-    logger.debug(f"Query params: {dict(request.query_params)}")
-    logger.debug(f"Body: {body_text}")
-    logger.debug("======================================")
+    verbose = _verbose(request)
+    if verbose:
+        logger.debug("Auth check: %s %s query=%s rid=%s", request.method, request.url.path,
+                     request.url.query, request.headers.get("x-request-id"))
 
     # --- Извлекаем и проверяем токен ---
     auth = request.headers.get("authorization", "")
-    logger.debug(f"Authorization header: {auth}")
 
     token = auth.split(" ", 1)[1] if auth.lower().startswith("bearer ") else None
     if not token:
         logger.warning("Missing bearer token")
         raise HTTPException(status_code=401, detail="Missing bearer token")
 
-    logger.debug(f"Sending token to introspect: {_INTROSPECT_URL}")
+    user = await _verify_local(token)
+    if user is not None:
+        if verbose:
+            logger.debug("Token verified locally via JWKS")
+        return user
 
     try:
         resp = await _client.post(_INTROSPECT_URL, json={"token": token})
-        logger.debug(f"Introspect response: {resp.status_code}")
-        logger.debug(f"Introspect body: {resp.text}")
+        if verbose:
+            logger.debug("Introspect response: %s", resp.status_code)
     except httpx.HTTPError as e:
         logger.error(f"Auth service unavailable: {e}")
         raise HTTPException(status_code=502, detail="Auth service unavailable")
@@ -75,8 +149,6 @@ async def get_current_user(request: Request) -> AuthUser:
         logger.error(f"Invalid JSON from introspect: {e}")
         raise HTTPException(status_code=502, detail="Auth service returned bad JSON")
 
-    logger.debug(f"Decoded introspect JSON: {data}")
-
     if not data.get("active"):
         logger.warning("Token inactive")
         raise HTTPException(status_code=401, detail="Token inactive")
@@ -85,7 +157,7 @@ async def get_current_user(request: Request) -> AuthUser:
         user_id=int(data.get("user_id", 0)),
         roles=data.get("roles") or []
     )
-    logger.info(f"Authenticated user_id={user.user_id}, roles={user.roles}")
+    logger.debug("Authenticated user_id=%s, roles=%s", user.user_id, user.roles)
     return user
 
 
@@ -93,12 +165,10 @@ def require_roles(*required: str):
     required_set = {r.lower() for r in required if r}
 
     async def _checker(user: AuthUser = Depends(get_current_user)) -> AuthUser:
-        logger.debug(f"Checking roles {required_set} for user {user.roles}")
         if not required_set:
             return user
         user_roles = {r.lower() for r in user.roles}
         if user_roles.intersection(required_set):
-            logger.info(f"Access granted for user {user.user_id}")
             return user
         logger.warning(f"Access denied for user {user.user_id}: missing roles {required_set}")
         raise HTTPException(status_code=403, detail="Forbidden")
@@ -1,11 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
+import httpx
 import logging
 
 from app.core.db import get_db
 from app.models.review import Review
 from app.schemas.review import ReviewCreate, ReviewOut, ReviewUpdate
+from app.services.external_api import get_users_data
 from app.utils.authz import get_current_user, AuthUser, require_roles
 
 logger = logging.getLogger(__name__)
@@ -13,20 +16,42 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/reviews", tags=["Reviews"])
 
 
+async def _with_authors(reviews: List[Review], request: Request) -> List[ReviewOut]:
+    """
+    Профили авторов одним POST /auth/users/batch на всю страницу, а не запросом на отзыв.
+    AuthService недоступен — отзывы отдаются без author, а не ошибкой.
+    """
+    out = [ReviewOut.model_validate(r, from_attributes=True) for r in reviews]
+    auth = request.headers.get("authorization", "")
+    token = auth.split(" ", 1)[1] if auth.lower().startswith("bearer ") else None
+    if not out or not token:
+        return out
+    try:
+        authors = await get_users_data((r.user_id for r in out), token=token)
+    except httpx.HTTPError as e:
+        logger.warning("Review authors lookup failed: %s", e)
+        return out
+    for r in out:
+        r.author = authors.get(r.user_id)
+    return out
+
+
 # -------------------------------
 # CRUD
 # -------------------------------
 @router.get("/book/{book_id}", response_model=List[ReviewOut])
-def get_reviews_for_book(book_id: int, db: Session = Depends(get_db)):
-    return db.query(Review).filter(Review.book_id == book_id).all()
+async def get_reviews_for_book(book_id: int, request: Request, db: Session = Depends(get_db)):
+    # Сессия синхронная — запрос в потоке, чтобы не блокировать event loop
+    reviews = await run_in_threadpool(lambda: db.query(Review).filter(Review.book_id == book_id).all())
+    return await _with_authors(reviews, request)
 
 
 @router.get("", response_model=List[ReviewOut])
-def get_reviews(book_id: int = None, db: Session = Depends(get_db)):
+async def get_reviews(request: Request, book_id: int = None, db: Session = Depends(get_db)):
     query = db.query(Review)
     if book_id is not None:
         query = query.filter(Review.book_id == book_id)
-    return query.all()
+    return await _with_authors(await run_in_threadpool(query.all), request)
 
 
 @router.post("", response_model=ReviewOut)
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from app.api.v1 import reviews
 from app.core.db import Base, engine
+from app.services import external_api
 from fastapi.middleware.cors import CORSMiddleware
 
 
@@ -17,4 +18,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-app.include_router(reviews.router)
\ No newline at end of file
+app.include_router(reviews.router)
+
+@app.on_event("shutdown")
+async def _close_clients():
+    await external_api.close()
@@ -21,6 +21,7 @@ class ReviewOut(ReviewBase):
     book_id: int
     user_id: int
     created_at: datetime
+    author: Optional[dict] = None   # публичные поля профиля из AuthService (только в списках)
 
     class Config:
         orm_mode = True